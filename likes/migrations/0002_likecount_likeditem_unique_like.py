@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicate_likes(apps, schema_editor):
+    # keep the oldest like of each (object, user) so the unique index can be built
+    LikedItem = apps.get_model('likes', 'LikedItem')
+    duplicates = (
+        LikedItem.objects.values('content_type', 'object_id', 'user')
+        .annotate(keep=Min('id'), n=Count('id'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        LikedItem.objects.filter(
+            content_type=row['content_type'], object_id=row['object_id'], user=row['user'],
+        ).exclude(id=row['keep']).delete()
+
+
+def fill_like_counts(apps, schema_editor):
+    LikedItem = apps.get_model('likes', 'LikedItem')
+    LikeCount = apps.get_model('likes', 'LikeCount')
+
+    LikeCount.objects.bulk_create([
+        LikeCount(content_type_id=row['content_type'], object_id=row['object_id'], count=row['n'])
+        for row in LikedItem.objects.values('content_type', 'object_id').annotate(n=Count('id')).order_by()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('likes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='likeditem',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id', 'user'), name='unique_like'),
+        ),
+        migrations.CreateModel(
+            name='LikeCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('content_type', 'object_id'), name='unique_like_count')],
+            },
+        ),
+        migrations.RunPython(fill_like_counts, migrations.RunPython.noop),
+    ]
@@ -9,3 +9,20 @@ class LikedItem(models.Model):
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
 
+    class Meta:
+        constraints = [
+            # one like per user per object; the index also serves the
+            # "which of these did I like" lookups
+            models.UniqueConstraint(fields=["content_type", "object_id", "user"], name="unique_like")
+        ]
+
+class LikeCount(models.Model):
+    # Denormalized number of likes per object, kept in sync by likes/signals.py
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["content_type", "object_id"], name="unique_like_count")
+        ]
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import LikedItem
+from .utils import change_like_count
+
+
+# Counts follow the LikedItem rows, including the ones removed by a cascade
+# (user deleted), so the view code never touches LikeCount itself
+@receiver(post_save, sender=LikedItem)
+def like_added(sender, instance, created, **kwargs):
+    if created:
+        change_like_count(instance.content_type_id, instance.object_id, 1)
+
+
+@receiver(post_delete, sender=LikedItem)
+def like_removed(sender, instance, **kwargs):
+    change_like_count(instance.content_type_id, instance.object_id, -1)
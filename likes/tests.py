@@ -1,3 +1,85 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
 from django.test import TestCase
+from django.urls import reverse
+
+from store.models import Brand, Product
+
+from .models import LikeCount, LikedItem
+from .utils import get_like_info, like, unlike
+
+
+class LikeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name="Brand")
+        cls.products = Product.objects.bulk_create([
+            Product(
+                brand=brand, title=f"Watch {i}", gender="men", dial_color="black", strap_color="black",
+                strap_material="steel", size=40, description="", unit_price=Decimal("100.00"), inventory=5,
+            )
+            for i in range(5)
+        ])
+        User = get_user_model()
+        cls.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        cls.bob = User.objects.create_user("bob", "bob@example.com", "pass")
+
+    def setUp(self):
+        ContentType.objects.get_for_model(Product)
+
+    def count(self, product):
+        row = LikeCount.objects.filter(object_id=product.id).first()
+        return row.count if row else 0
+
+    def test_like_is_idempotent(self):
+        product = self.products[0]
+        self.assertTrue(like(self.alice, Product, product.id))
+        self.assertFalse(like(self.alice, Product, product.id))
+        like(self.bob, Product, product.id)
+
+        self.assertEqual(LikedItem.objects.count(), 2)
+        self.assertEqual(self.count(product), 2)
+
+        self.assertTrue(unlike(self.alice, Product, product.id))
+        self.assertFalse(unlike(self.alice, Product, product.id))
+        self.assertEqual(self.count(product), 1)
+
+    def test_count_follows_cascade(self):
+        product = self.products[0]
+        like(self.alice, Product, product.id)
+        like(self.bob, Product, product.id)
+
+        self.bob.delete()
+        self.assertEqual(self.count(product), 1)
+
+    def test_like_info_two_queries(self):
+        like(self.alice, Product, self.products[1].id)
+        like(self.bob, Product, self.products[1].id)
+        like(self.bob, Product, self.products[3].id)
+        ids = [p.id for p in self.products]
+
+        with self.assertNumQueries(2):
+            info = get_like_info(Product, ids, self.alice)
+        with self.assertNumQueries(1):
+            get_like_info(Product, ids, None)
+
+        self.assertEqual(info[ids[1]], {"count": 2, "liked": True})
+        self.assertEqual(info[ids[3]], {"count": 1, "liked": False})
+        self.assertEqual(info[ids[0]], {"count": 0, "liked": False})
+
+    def test_endpoint(self):
+        product = self.products[2]
+        self.client.force_login(self.alice)
+        url = reverse("product-like", args=[product.id])
+
+        self.client.post(url)
+        response = self.client.post(url, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.json(), {"product_id": product.id, "liked": True, "count": 1})
+
+        response = self.client.post(reverse("product-unlike", args=[product.id]), HTTP_ACCEPT="application/json")
+        self.assertEqual(response.json(), {"product_id": product.id, "liked": False, "count": 0})
 
-# Create your tests here.
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(reverse("product-like", args=[10 ** 6])).status_code, 404)
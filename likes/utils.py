@@ -0,0 +1,100 @@
+from asgiref.sync import sync_to_async
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import LikeCount, LikedItem
+
+
+def like(user, model, object_id):
+    # Idempotent: a second like hits the unique index and changes nothing.
+    # Returns True if this call added the like.
+    content_type = ContentType.objects.get_for_model(model)
+    try:
+        with transaction.atomic():
+            LikedItem.objects.create(user=user, content_type=content_type, object_id=object_id)
+    except IntegrityError:
+        return False
+    return True
+
+
+def unlike(user, model, object_id):
+    content_type = ContentType.objects.get_for_model(model)
+    deleted, _ = LikedItem.objects.filter(user=user, content_type=content_type, object_id=object_id).delete()
+    return bool(deleted)
+
+
+def change_like_count(content_type_id, object_id, delta):
+    # Same shape as add_to_cart: UPDATE count = count + n, INSERT the
+    # first time, and fall back to the UPDATE if someone inserted first
+    counts = LikeCount.objects.filter(content_type_id=content_type_id, object_id=object_id)
+
+    if delta < 0:
+        counts.filter(count__gte=-delta).update(count=F("count") + delta)
+        return
+
+    if counts.update(count=F("count") + delta):
+        return
+
+    try:
+        with transaction.atomic():
+            LikeCount.objects.create(content_type_id=content_type_id, object_id=object_id, count=delta)
+    except IntegrityError:
+        counts.update(count=F("count") + delta)
+
+
+def _like_queries(content_type, object_ids, user):
+    counts = LikeCount.objects.filter(content_type=content_type, object_id__in=object_ids)
+    liked = None
+    if user is not None and user.is_authenticated:
+        liked = LikedItem.objects.filter(content_type=content_type, object_id__in=object_ids, user=user)
+        liked = liked.values_list("object_id", flat=True)
+    return counts.values_list("object_id", "count"), liked
+
+
+def _like_info(object_ids, counts, liked):
+    return {pk: {"count": counts.get(pk, 0), "liked": pk in liked} for pk in object_ids}
+
+
+def get_like_info(model, object_ids, user=None):
+    """
+    {object_id: {"count", "liked"}} for a page of objects. Two queries at
+    most (one for anonymous users), however many objects there are.
+    """
+    object_ids = list(object_ids)
+    content_type = ContentType.objects.get_for_model(model)
+    counts, liked = _like_queries(content_type, object_ids, user)
+    return _like_info(object_ids, dict(counts), set(liked) if liked is not None else set())
+
+
+async def aget_like_info(model, object_ids, user=None):
+    object_ids = list(object_ids)
+    # cached after the first call, but that first call is a sync query
+    content_type = await sync_to_async(ContentType.objects.get_for_model)(model)
+    counts, liked = _like_queries(content_type, object_ids, user)
+    counts = {pk: count async for pk, count in counts}
+    liked = {pk async for pk in liked} if liked is not None else set()
+    return _like_info(object_ids, counts, liked)
+
+
+def _attach(objects, info):
+    for obj in objects:
+        obj.like_count = info[obj.pk]["count"]
+        obj.liked_by_me = info[obj.pk]["liked"]
+    return objects
+
+
+def attach_likes(objects, user, model=None):
+    # model: whose likes to read when `objects` are a copy of it
+    # (CatalogListing rows carry the Product id)
+    objects = list(objects)
+    if not objects:
+        return objects
+    return _attach(objects, get_like_info(model or type(objects[0]), [obj.pk for obj in objects], user))
+
+
+async def aattach_likes(objects, user, model=None):
+    objects = list(objects)
+    if not objects:
+        return objects
+    return _attach(objects, await aget_like_info(model or type(objects[0]), [obj.pk for obj in objects], user))
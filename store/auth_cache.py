@@ -0,0 +1,103 @@
+from functools import partial
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .models import Customer
+
+USER_CACHE_TIMEOUT = 60 * 5
+
+
+def user_cache_key(user_id):
+    return f"auth-user:{user_id}"
+
+
+def _session_user_key(user_id, backend_path, session_hash):
+    # what auth.get_user() needs before it may trust a user id
+    if user_id is None or not session_hash or backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return None
+    return user_cache_key(user_id)
+
+
+def _verified(user, session_hash):
+    # the same check auth.get_user() makes, a changed password fails it
+    return user is not None and constant_time_compare(session_hash, user.get_session_auth_hash())
+
+
+def _with_profile(user, customer):
+    # customer may be None, cached as "no profile" so it isn't looked up again
+    get_user_model().customer_profile.related.set_cached_value(user, customer)
+    return user
+
+
+def get_cached_user(request):
+    """
+    auth.get_user() with the user (and its customer_profile) cached for a
+    few minutes. A hit costs no query; anything that doesn't verify
+    against the session hash goes the normal, uncached way.
+    """
+    session = request.session
+    session_hash = session.get(HASH_SESSION_KEY)
+    key = _session_user_key(session.get(SESSION_KEY), session.get(BACKEND_SESSION_KEY), session_hash)
+
+    if key:
+        user = cache.get(key)
+        if _verified(user, session_hash):
+            return user
+
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        _with_profile(user, Customer.objects.filter(user=user).first())
+        cache.set(user_cache_key(user.pk), user, USER_CACHE_TIMEOUT)
+    return user
+
+
+async def aget_cached_user(request):
+    session = request.session
+    session_hash = await session.aget(HASH_SESSION_KEY)
+    key = _session_user_key(
+        await session.aget(SESSION_KEY), await session.aget(BACKEND_SESSION_KEY), session_hash
+    )
+
+    if key:
+        user = await cache.aget(key)
+        if _verified(user, session_hash):
+            return user
+
+    user = await auth.aget_user(request)
+    if user.is_authenticated:
+        _with_profile(user, await Customer.objects.filter(user=user).afirst())
+        await cache.aset(user_cache_key(user.pk), user, USER_CACHE_TIMEOUT)
+    return user
+
+
+def invalidate_cached_user(user_id):
+    # on commit: a reader in between would otherwise re-cache the old row
+    transaction.on_commit(lambda: cache.delete(user_cache_key(user_id)))
+
+
+def _get_user(request):
+    if not hasattr(request, "_cached_user"):
+        request._cached_user = get_cached_user(request)
+    return request._cached_user
+
+
+async def _aget_user(request):
+    if not hasattr(request, "_acached_user"):
+        request._acached_user = await aget_cached_user(request)
+    return request._acached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware, with request.user coming from the cache."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _get_user(request))
+        request.auser = partial(_aget_user, request)
@@ -0,0 +1,96 @@
+import statistics
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.test import Client
+from django.utils.crypto import get_random_string
+
+
+def bench_client(user=None):
+    # REMOTE_ADDR outside INTERNAL_IPS keeps debug_toolbar out of the numbers
+    client = Client(HTTP_HOST="localhost", REMOTE_ADDR="203.0.113.10")
+    if user is not None:
+        client.force_login(user)
+    return client
+
+
+def percentile(sorted_samples, pct):
+    # nearest-rank percentile
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_samples)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def summarize(latencies, wall_seconds):
+    # latencies in seconds, results in ms / requests per second
+    samples = sorted(latencies)
+    return {
+        "requests": len(samples),
+        "throughput": round(len(samples) / wall_seconds, 2) if wall_seconds else 0.0,
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+    }
+
+
+class ClientSession:
+    """One shopper driven in-process through the Django test client."""
+
+    def __init__(self, user):
+        self.client = bench_client(user)
+
+    def request(self, method, path, data=None):
+        start = time.perf_counter()
+        response = getattr(self.client, method)(path, data or {})
+        return time.perf_counter() - start, response.status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # time each hop on its own, like the test client does
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    """
+    One shopper against a running server. Logs in by writing the session
+    straight to the session store, so no login form round trip.
+    """
+
+    def __init__(self, base_url, user, timeout=30.0):
+        client = Client()
+        client.force_login(user)
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        # any 32 char alphanumeric string is a valid CSRF secret
+        self.csrf_token = get_random_string(32)
+        self.cookies = {
+            settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value,
+            settings.CSRF_COOKIE_NAME: self.csrf_token,
+        }
+        self.opener = urllib.request.build_opener(_NoRedirect)
+
+    def request(self, method, path, data=None):
+        headers = {"Cookie": "; ".join(f"{k}={v}" for k, v in self.cookies.items())}
+        body = None
+        if method == "post":
+            headers["X-CSRFToken"] = self.csrf_token
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            body = urlencode(data or {}).encode()
+
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method.upper())
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as exc:
+            status = exc.code  # includes the 302s we refuse to follow
+        except (urllib.error.URLError, TimeoutError):
+            status = None
+        return time.perf_counter() - start, status
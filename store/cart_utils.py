@@ -1,8 +1,174 @@
-from store.models import Cart
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Least
+from django.http import Http404
+from django.utils import timezone
+
+from store.models import Cart, CartItem, Product
+
+CART_SUMMARY_TIMEOUT = 60 * 60
+CART_TOUCH_INTERVAL = timedelta(days=1)
+
+# CartItem.quantity is a PositiveSmallIntegerField
+MAX_LINE_QUANTITY = 32767
+
 
 def get_or_create_cart(user):
     cart, created = Cart.objects.get_or_create(
         user=user,
         status=Cart.Status.OPENED
     )
+    # Only mutating paths get here (reads peek), so this marks activity for
+    # prune_carts. Changing items never saves the cart, hence the touch, at
+    # most once a day per cart.
+    now = timezone.now()
+    if not created and cart.updated_at < now - CART_TOUCH_INTERVAL:
+        if not Cart.objects.filter(pk=cart.pk).update(updated_at=now):
+            # pruned between the two statements
+            return get_or_create_cart(user)
+        cart.updated_at = now
     return cart
+
+
+def peek_cart(user):
+    # Read-only: the opened cart, or an unsaved empty one. Only the
+    # mutating views create the row, browsing never INSERTs.
+    cart = Cart.objects.filter(user=user, status=Cart.Status.OPENED).first()
+    return cart or Cart(user=user)
+
+
+async def apeek_cart(user):
+    cart = await Cart.objects.filter(user=user, status=Cart.Status.OPENED).afirst()
+    return cart or Cart(user=user)
+
+
+def add_to_cart(cart, product_id, quantity):
+    # Existing line: a single UPDATE ... SET quantity = quantity + n, so two
+    # quick clicks both count. New line: INSERT, and if another request beat
+    # us to it (unique_cart_product) fall back to the UPDATE.
+    # Lines stop at MAX_LINE_QUANTITY; LEAST(quantity, MAX - n) + n is the
+    # capped sum without ever going past the smallint column.
+    quantity = min(quantity, MAX_LINE_QUANTITY)
+    capped_sum = Least(F("quantity"), MAX_LINE_QUANTITY - quantity) + quantity
+    lines = CartItem.objects.filter(cart=cart, product_id=product_id)
+
+    if lines.update(quantity=capped_sum):
+        return
+
+    if not Product.objects.filter(pk=product_id).exists():
+        raise Http404("No Product matches the given query.")
+
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(cart=cart, product_id=product_id, quantity=quantity)
+    except IntegrityError:
+        lines.update(quantity=capped_sum)
+
+
+def decrement_cart_item(cart, product_id):
+    lines = CartItem.objects.filter(cart=cart, product_id=product_id)
+
+    # drop one, or the whole line if it was the last one
+    if not lines.filter(quantity__gt=1).update(quantity=F("quantity") - 1):
+        lines.delete()
+
+
+def set_cart_quantities(cart, quantities, replace=False):
+    """
+    Apply {product_id: quantity} to the cart in three statements whatever
+    its size: one lookup of the products, one DELETE for zero quantities
+    (or, with replace, every line not listed) and one upsert for the rest.
+    Returns the product ids that don't exist, which are skipped.
+    """
+    known = set(Product.objects.filter(pk__in=quantities).values_list("pk", flat=True))
+    wanted = {pid: qty for pid, qty in quantities.items() if pid in known and qty > 0}
+
+    lines = CartItem.objects.filter(cart=cart)
+    if replace:
+        lines.exclude(product_id__in=wanted).delete()
+    else:
+        lines.filter(product_id__in=[pid for pid, qty in quantities.items() if qty <= 0]).delete()
+
+    CartItem.objects.bulk_create(
+        [CartItem(cart=cart, product_id=pid, quantity=qty) for pid, qty in wanted.items()],
+        update_conflicts=True,
+        unique_fields=["cart", "product"],
+        update_fields=["quantity"],
+    )
+
+    return sorted(set(quantities) - known)
+
+
+@transaction.atomic
+def merge_guest_cart(user, quantities):
+    """
+    Add a guest cart's {product_id: quantity} to the user's opened cart:
+    one read of the lines already there, then a single upsert.
+    """
+    if not quantities:
+        return []
+
+    cart = get_or_create_cart(user)
+    existing = dict(
+        CartItem.objects.select_for_update()
+        .filter(cart=cart, product_id__in=quantities)
+        .values_list("product_id", "quantity")
+    )
+    merged = {
+        product_id: min(quantity + existing.get(product_id, 0), MAX_LINE_QUANTITY)
+        for product_id, quantity in quantities.items()
+    }
+
+    unknown = set_cart_quantities(cart, merged)
+    invalidate_cart_summary(user.pk)
+    return unknown
+
+
+def cart_summary_key(user_id):
+    return f"cart-summary:{user_id}"
+
+
+def get_cart_summary(user):
+    # {"count", "subtotal"} of the user's opened cart, cached per user.
+    # A miss is one aggregate query and never creates a cart.
+    key = cart_summary_key(user.pk)
+    summary = cache.get(key)
+
+    if summary is None:
+        totals = CartItem.objects.filter(
+            cart__user=user,
+            cart__status=Cart.Status.OPENED,
+        ).totals()
+        summary = {
+            "count": totals["total_items"],
+            "subtotal": totals["subtotal"],
+        }
+        cache.set(key, summary, CART_SUMMARY_TIMEOUT)
+
+    return summary
+
+
+async def aget_cart_summary(user):
+    key = cart_summary_key(user.pk)
+    summary = await cache.aget(key)
+
+    if summary is None:
+        totals = await CartItem.objects.filter(
+            cart__user=user,
+            cart__status=Cart.Status.OPENED,
+        ).atotals()
+        summary = {
+            "count": totals["total_items"],
+            "subtotal": totals["subtotal"],
+        }
+        await cache.aset(key, summary, CART_SUMMARY_TIMEOUT)
+
+    return summary
+
+
+def invalidate_cart_summary(user_id):
+    # on commit: a reader in between would otherwise re-cache the old totals
+    transaction.on_commit(lambda: cache.delete(cart_summary_key(user_id)))
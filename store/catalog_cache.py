@@ -0,0 +1,110 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_TIMEOUT = 60 * 10
+
+
+def catalog_version():
+    # Every catalog cache key embeds this number, bumping it drops them all
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # start from the clock so an evicted counter never reuses old keys
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+async def acatalog_version():
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, int(time.time() * 1000), None)
+        version = await cache.aget(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    # jump to the clock, so the version also says when the catalog last
+    # changed (see fill_timeout)
+    version = cache.get(CATALOG_VERSION_KEY) or 0
+    cache.set(CATALOG_VERSION_KEY, max(int(time.time() * 1000), version + 1), None)
+
+
+def filter_key(filters):
+    raw = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def catalog_cache_key(prefix, filters, version=None):
+    if version is None:
+        version = catalog_version()
+    return f"catalog:{version}:{prefix}:{filter_key(filters)}"
+
+
+def fill_timeout(version, timeout=CATALOG_TIMEOUT):
+    # A replica can still serve the old rows right after a change, so what
+    # we read then is only kept until the replicas have caught up
+    window = getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+    if getattr(settings, "DATABASE_REPLICAS", None) and time.time() * 1000 - version < window * 1000:
+        return min(timeout, window)
+    return timeout
+
+
+def get_or_set_catalog(prefix, filters, compute, timeout=CATALOG_TIMEOUT):
+    # compute() runs only on a miss, entries die with the catalog version
+    version = catalog_version()
+    return cache.get_or_set(catalog_cache_key(prefix, filters, version), compute, fill_timeout(version, timeout))
+
+
+async def aget_or_set_catalog(prefix, filters, acompute, timeout=CATALOG_TIMEOUT):
+    # acompute is a coroutine function, awaited only on a miss
+    version = await acatalog_version()
+    key = catalog_cache_key(prefix, filters, version)
+    value = await cache.aget(key)
+    if value is None:
+        value = await acompute()
+        await cache.aset(key, value, fill_timeout(version, timeout))
+    return value
+
+
+def product_version_key(pk):
+    return f"product:{pk}:version"
+
+
+def get_product_version(pk):
+    # last_update of one product, cached so a 304 needs no query at all
+    from .models import Product
+
+    key = product_version_key(pk)
+    version = cache.get(key)
+
+    if version is None:
+        version = Product.objects.filter(pk=pk).values_list("last_update", flat=True).first()
+        if version is not None:
+            cache.set(key, version, fill_timeout(catalog_version()))
+
+    return version
+
+
+async def aget_product_version(pk):
+    from .models import Product
+
+    key = product_version_key(pk)
+    version = await cache.aget(key)
+
+    if version is None:
+        version = await Product.objects.filter(pk=pk).values_list("last_update", flat=True).afirst()
+        if version is not None:
+            await cache.aset(key, version, fill_timeout(await acatalog_version()))
+
+    return version
+
+
+def invalidate_product_versions(pks):
+    keys = [product_version_key(pk) for pk in pks]
+    transaction.on_commit(lambda: cache.delete_many(keys))
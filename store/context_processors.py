@@ -1,7 +1,13 @@
-from .cart_utils import get_or_create_cart
+from .cart_utils import get_cart_summary
 
 def cart_item_count(request):
+    # async views fetch the summary up front, no cache/DB work during render
+    summary = getattr(request, "cart_summary", None)
+    if summary is not None:
+        return {"cart_count": summary["count"]}
+
     if request.user.is_authenticated:
-        cart = get_or_create_cart(request.user)
-        return {"cart_count": cart.total_items}
-    return {"cart_count": 0}
+        return {"cart_count": get_cart_summary(request.user)["count"]}
+
+    guest_cart = getattr(request, "guest_cart", None)
+    return {"cart_count": guest_cart.count if guest_cart is not None else 0}
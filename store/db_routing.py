@@ -0,0 +1,137 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = "default"
+STICKY_COOKIE = "primary_until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class _ReadState:
+    # mutable on purpose: sync_to_async copies the context, not this object,
+    # so a write seen in a worker thread still reaches the middleware
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+_state = ContextVar("db_read_state", default=None)
+
+
+def replicas():
+    return list(getattr(settings, "DATABASE_REPLICAS", []))
+
+
+def sticky_seconds():
+    return getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+
+
+@contextmanager
+def replica_reads(alias=None):
+    """
+    Send the reads inside the block to a replica (random one unless `alias`
+    is given). Writes, and reads after the first write, still go to the
+    primary. A no-op when no replicas are configured.
+    """
+    pool = replicas()
+    token = _state.set(_ReadState(alias or random.choice(pool)) if pool else None)
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Reads go to the primary unless the code runs inside replica_reads()
+    (which ReplicaRoutingMiddleware opens for safe, non-sticky requests).
+    Everything else - writes, migrations, management commands - stays on
+    the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.wrote:
+            return PRIMARY
+        if connections[PRIMARY].in_atomic_block:
+            # reads inside a transaction have to see its own writes
+            return PRIMARY
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        pool = {PRIMARY, *replicas()}
+        return obj1._state.db in pool and obj2._state.db in pool
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serves GET/HEAD requests from a replica, with read-your-writes: a
+    request that writes (or any POST) sets a short-lived cookie that keeps
+    the browser's following requests on the primary until the replicas
+    have caught up. Other shoppers may see a catalog change that late,
+    catalog_cache.fill_timeout keeps that from sticking in the cache.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def use_replica(self, request):
+        if not replicas() or request.method not in SAFE_METHODS:
+            return False
+        try:
+            pinned_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        return pinned_until <= time.time()
+
+    def read_state(self, request):
+        return _ReadState(random.choice(replicas())) if self.use_replica(request) else None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.read_state(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.stick(request, response, state)
+
+    async def __acall__(self, request):
+        # the views' sync_to_async calls copy this context, so they see state
+        state = self.read_state(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.stick(request, response, state)
+
+    def stick(self, request, response, state):
+        if request.method not in SAFE_METHODS or (state and state.wrote):
+            window = sticky_seconds()
+            response.set_cookie(
+                STICKY_COOKIE, f"{time.time() + window:.3f}", max_age=window, httponly=True, samesite="Lax",
+            )
+        return response
@@ -0,0 +1,101 @@
+from decimal import Decimal
+
+from django.db.models import BooleanField, Case, Count, IntegerField, Value, When
+
+from .catalog_cache import aget_or_set_catalog, get_or_set_catalog
+from .filters import ALLOWED_GENDERS, apply_filters, price_q
+
+PRICE_BUCKETS = [
+    ("Under $100", None, Decimal("100")),
+    ("$100 - $250", Decimal("100"), Decimal("250")),
+    ("$250 - $500", Decimal("250"), Decimal("500")),
+    ("$500 - $1000", Decimal("500"), Decimal("1000")),
+    ("$1000 and up", Decimal("1000"), None),
+]
+
+
+def _bucket_case():
+    whens = []
+    for index, (_, low, high) in enumerate(PRICE_BUCKETS):
+        conditions = {}
+        if low is not None:
+            conditions["unit_price__gte"] = low
+        if high is not None:
+            conditions["unit_price__lt"] = high
+        whens.append(When(then=Value(index), **conditions))
+    return Case(*whens, output_field=IntegerField())
+
+
+def _facet_rows(queryset, filters, exclude=()):
+    """
+    Brand, gender and price bucket counts for the current filters.
+
+    Each facet ignores its own selection (so picking "Casio" still shows
+    how many "Seiko" there are), which would normally mean one query per
+    facet. Instead we GROUP BY every facet column once, with the price
+    range as a boolean column, and do the cross-filtering in Python over
+    the (small) grouped result.
+    """
+    # exclude: filters the caller already applied to `queryset`
+    base = apply_filters(queryset, filters, exclude={"brand", "gender", "price", *exclude})
+
+    price_filter = price_q(filters)
+    if price_filter:
+        in_price = Case(When(price_filter, then=Value(True)), default=Value(False), output_field=BooleanField())
+    else:
+        in_price = Value(True, output_field=BooleanField())
+
+    return (
+        base.annotate(price_bucket=_bucket_case(), in_price=in_price)
+        .values("brand_id", "gender", "price_bucket", "in_price")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+
+
+def _fold_facets(rows, filters):
+    brands = set(filters["brand"])
+    genders = set(filters["gender"])
+
+    brand_counts = {}
+    gender_counts = {gender: 0 for gender in ALLOWED_GENDERS}
+    bucket_counts = [0] * len(PRICE_BUCKETS)
+
+    for row in rows:
+        brand_ok = not brands or row["brand_id"] in brands
+        gender_ok = not genders or row["gender"] in genders
+
+        if gender_ok and row["in_price"]:
+            brand_counts[row["brand_id"]] = brand_counts.get(row["brand_id"], 0) + row["n"]
+
+        if brand_ok and row["in_price"] and row["gender"] in gender_counts:
+            gender_counts[row["gender"]] += row["n"]
+
+        if brand_ok and gender_ok and row["price_bucket"] is not None:
+            bucket_counts[row["price_bucket"]] += row["n"]
+
+    return {
+        "brand": brand_counts,
+        "gender": gender_counts,
+        "price": [
+            {"label": label, "min_price": low, "max_price": high, "count": count}
+            for (label, low, high), count in zip(PRICE_BUCKETS, bucket_counts)
+        ],
+    }
+
+
+def compute_facets(queryset, filters, exclude=()):
+    return _fold_facets(list(_facet_rows(queryset, filters, exclude)), filters)
+
+
+async def acompute_facets(queryset, filters, exclude=()):
+    rows = [row async for row in _facet_rows(queryset, filters, exclude)]
+    return _fold_facets(rows, filters)
+
+
+def get_facets(queryset, filters, exclude=()):
+    return get_or_set_catalog("facets", filters, lambda: compute_facets(queryset, filters, exclude))
+
+
+async def aget_facets(queryset, filters, exclude=()):
+    return await aget_or_set_catalog("facets", filters, lambda: acompute_facets(queryset, filters, exclude))
@@ -0,0 +1,128 @@
+import csv
+import json
+import zlib
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Product
+
+FEED_FIELDS = [
+    "id", "sku", "title", "brand", "gender", "dial_color", "strap_color",
+    "strap_material", "size", "description", "unit_price", "inventory",
+    "in_stock", "image_url", "last_update",
+]
+FEED_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+CHUNK_SIZE = 2000
+BUFFER_BYTES = 64 * 1024
+
+
+def parse_since(value):
+    # "2026-01-31" or a full ISO datetime, None when empty, ValueError when bad
+    if not value:
+        return None
+
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"invalid date: {value!r}")
+        since = datetime.combine(day, time.min)
+
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def feed_rows(since=None, base_url=""):
+    # iterator() streams from a server-side cursor, CHUNK_SIZE rows at a time
+    products = Product.objects.select_related("brand").order_by("id")
+    if since is not None:
+        products = products.filter(last_update__gt=since)
+
+    for product in products.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            "id": product.id,
+            "sku": product.sku or "",
+            "title": product.title,
+            "brand": product.brand.name,
+            "gender": product.gender,
+            "dial_color": product.dial_color,
+            "strap_color": product.strap_color,
+            "strap_material": product.strap_material,
+            "size": product.size,
+            "description": product.description,
+            "unit_price": product.unit_price,
+            "inventory": product.inventory,
+            "in_stock": product.in_stock,
+            "image_url": f"{base_url}{product.image.url}" if product.image else "",
+            "last_update": product.last_update.isoformat(),
+        }
+
+
+class _Echo:
+    # csv.writer wants a file, this one just hands the line back
+    def write(self, value):
+        return value
+
+
+def csv_chunks(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FEED_FIELDS)
+    for row in rows:
+        yield writer.writerow([row[field] for field in FEED_FIELDS])
+
+
+def jsonl_chunks(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def feed_chunks(fmt, rows):
+    return csv_chunks(rows) if fmt == "csv" else jsonl_chunks(rows)
+
+
+def buffered(chunks, size=BUFFER_BYTES):
+    # str chunks -> bytes of roughly `size`, fewer tiny writes on the socket
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        data = chunk.encode()
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b"".join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def gzip_chunks(chunks):
+    # wbits 31 = gzip header/trailer, compressed as it streams
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+_done = object()
+
+
+async def aiter_chunks(chunks):
+    # Under ASGI a sync iterator is list()ed in a thread before the first
+    # byte goes out. Pulling one chunk per sync_to_async keeps memory flat;
+    # thread_sensitive keeps the server-side cursor on its connection.
+    chunks = iter(chunks)
+    pull = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await pull(chunks, _done)) is not _done:
+        yield chunk
@@ -0,0 +1,106 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.http import QueryDict
+
+from tags.utils import tagged_object_ids
+
+from .models import Product
+from .search import search_products
+
+ALLOWED_GENDERS = [value for value, _ in Product.GENDER_CHOICES]
+MAX_TAGS = 10
+
+
+def _price(raw):
+    raw = (raw or "").strip()
+    if not raw:
+        return None
+
+    try:
+        value = Decimal(raw)
+        # NaN / Infinity parse fine but can't be compared with a price
+        return value.quantize(Decimal("0.01")) if value.is_finite() else None
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _brand_ids(values):
+    # isdigit() would let "²" through to int(), ASCII digits only
+    return sorted({int(b) for b in values if b.isascii() and b.isdecimal()})
+
+
+def parse_filters(params):
+    """
+    Turn request.GET into a normalized filter dict. Invalid values are
+    dropped (like before), lists are deduped and sorted so two URLs that
+    mean the same thing give the same dict.
+    """
+    return {
+        "q": " ".join((params.get("q") or "").split()),
+        "brand": _brand_ids(params.getlist("brand")),
+        "gender": sorted({g for g in params.getlist("gender") if g in ALLOWED_GENDERS}),
+        "min_price": _price(params.get("min_price")),
+        "max_price": _price(params.get("max_price")),
+        "tag": sorted({t.strip() for t in params.getlist("tag") if t.strip()})[:MAX_TAGS],
+        # ?tag=a&tag=b means both unless tag_mode=any
+        "tag_mode": "any" if params.get("tag_mode") == "any" else "all",
+    }
+
+
+def canonical_query(filters, **extra):
+    # filters (+ extra non-empty params) back to a query string, fixed order
+    params = QueryDict(mutable=True)
+
+    if filters["q"]:
+        params["q"] = filters["q"]
+    if filters["brand"]:
+        params.setlist("brand", [str(b) for b in filters["brand"]])
+    if filters["gender"]:
+        params.setlist("gender", filters["gender"])
+    if filters["min_price"] is not None:
+        params["min_price"] = str(filters["min_price"])
+    if filters["max_price"] is not None:
+        params["max_price"] = str(filters["max_price"])
+    if filters["tag"]:
+        params.setlist("tag", filters["tag"])
+        if filters["tag_mode"] != "all":
+            params["tag_mode"] = filters["tag_mode"]
+
+    for key, value in extra.items():
+        if value:
+            params[key] = value
+
+    return params.urlencode()
+
+
+def price_q(filters):
+    q = Q()
+    if filters["min_price"] is not None:
+        q &= Q(unit_price__gte=filters["min_price"])
+    if filters["max_price"] is not None:
+        q &= Q(unit_price__lte=filters["max_price"])
+    return q
+
+
+def apply_filters(queryset, filters, exclude=()):
+    # exclude lets the facet engine skip the facets it is counting
+    qs = queryset
+
+    if filters["q"] and "q" not in exclude:
+        qs = search_products(qs, filters["q"])
+
+    if filters["brand"] and "brand" not in exclude:
+        qs = qs.filter(brand_id__in=filters["brand"])
+
+    if filters["gender"] and "gender" not in exclude:
+        qs = qs.filter(gender__in=filters["gender"])
+
+    if "price" not in exclude:
+        qs = qs.filter(price_q(filters))
+
+    if filters["tag"] and "tag" not in exclude:
+        # listing ids are product ids
+        qs = qs.filter(id__in=tagged_object_ids(Product, filters["tag"], filters["tag_mode"] == "all"))
+
+    return qs
@@ -0,0 +1,122 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .cart_utils import MAX_LINE_QUANTITY
+from .models import CartItem, Product
+
+COOKIE_NAME = "guest_cart"
+COOKIE_SALT = "store.guest_cart"
+COOKIE_MAX_AGE = 60 * 60 * 24 * 30
+
+# keeps the cookie well under the 4KB browsers allow
+MAX_LINES = 50
+
+
+def decode(raw):
+    # "12:2|40:1" -> {12: 2, 40: 1}, anything malformed is dropped
+    quantities = {}
+    for part in raw.split("|") if raw else []:
+        product_id, _, quantity = part.partition(":")
+        if product_id.isdigit() and quantity.isdigit() and int(quantity) > 0:
+            quantities[int(product_id)] = min(int(quantity), MAX_LINE_QUANTITY)
+    return dict(list(quantities.items())[:MAX_LINES])
+
+
+def encode(quantities):
+    return "|".join(f"{product_id}:{quantity}" for product_id, quantity in quantities.items())
+
+
+class GuestCart:
+    """
+    An anonymous visitor's cart, kept in a signed cookie: no Cart row and no
+    session write per visitor. Merged into the real cart on login (see
+    cart_utils.merge_guest_cart).
+    """
+
+    def __init__(self, quantities=None):
+        self.quantities = dict(quantities or {})
+        self.modified = False
+
+    @classmethod
+    def from_request(cls, request):
+        raw = request.get_signed_cookie(COOKIE_NAME, default="", salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE)
+        return cls(decode(raw))
+
+    def __len__(self):
+        return len(self.quantities)
+
+    @property
+    def count(self):
+        return sum(self.quantities.values())
+
+    def add(self, product_id, quantity):
+        if product_id not in self.quantities and len(self.quantities) >= MAX_LINES:
+            raise ValueError(f"A guest basket holds at most {MAX_LINES} products, please log in.")
+        self.quantities[product_id] = min(self.quantities.get(product_id, 0) + quantity, MAX_LINE_QUANTITY)
+        self.modified = True
+
+    def decrement(self, product_id):
+        quantity = self.quantities.get(product_id, 0)
+        if quantity > 1:
+            self.quantities[product_id] = quantity - 1
+        else:
+            self.quantities.pop(product_id, None)
+        self.modified = True
+
+    def remove(self, product_id):
+        self.quantities.pop(product_id, None)
+        self.modified = True
+
+    def clear(self):
+        self.quantities = {}
+        self.modified = True
+
+    def _items(self, products):
+        # unsaved CartItems so templates and line_total work as for a real cart;
+        # products deleted since they were added just drop out
+        return [
+            CartItem(product=products[product_id], quantity=quantity)
+            for product_id, quantity in self.quantities.items()
+            if product_id in products
+        ]
+
+    def items(self):
+        return self._items(Product.objects.in_bulk(list(self.quantities)) if self.quantities else {})
+
+    async def aitems(self):
+        return self._items(await Product.objects.ain_bulk(list(self.quantities)) if self.quantities else {})
+
+    def save(self, response):
+        if not self.modified:
+            return
+        if self.quantities:
+            response.set_signed_cookie(
+                COOKIE_NAME, encode(self.quantities), salt=COOKIE_SALT,
+                max_age=COOKIE_MAX_AGE, httponly=True, samesite="Lax",
+            )
+        else:
+            response.delete_cookie(COOKIE_NAME, samesite="Lax")
+
+
+class GuestCartMiddleware:
+    # reading and writing the cookie never touches the DB, so both ways are cheap
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.guest_cart = GuestCart.from_request(request)
+        response = self.get_response(request)
+        request.guest_cart.save(response)
+        return response
+
+    async def __acall__(self, request):
+        request.guest_cart = GuestCart.from_request(request)
+        response = await self.get_response(request)
+        request.guest_cart.save(response)
+        return response
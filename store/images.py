@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# derivative name -> max width in px
+IMAGE_SIZES = {
+    "thumb": 160,
+    "card": 480,
+    "zoom": 1200,
+}
+DERIVED_DIR = "products/derived"
+# a missing derivative is asked about again after this long
+MISSING_TIMEOUT = 60
+
+_executor = None
+_known = set()
+
+
+def derivative_name(name, size):
+    # The stem keeps it readable, the hash of the full path keeps foo.jpg,
+    # foo.png and other/foo.jpg apart. Storage never reuses a name for a
+    # different upload (it picks foo_AbC12.jpg), so the path is enough.
+    stem = os.path.splitext(os.path.basename(name))[0]
+    digest = hashlib.sha1(name.encode()).hexdigest()[:10]
+    return f"{DERIVED_DIR}/{stem}_{digest}_{size}.webp"
+
+
+def _exists_key(target):
+    return f"image-derivative:{target}"
+
+
+def derivative_exists(name, size):
+    # Derivatives are never deleted, so a yes is kept for good (in process
+    # and in the cache). A no is cached briefly, else every card on every
+    # render would ask the storage, a round trip on remote storage.
+    target = derivative_name(name, size)
+    if target in _known:
+        return True
+
+    exists = cache.get(_exists_key(target))
+    if exists is None:
+        exists = default_storage.exists(target)
+        cache.set(_exists_key(target), exists, None if exists else MISSING_TIMEOUT)
+    if exists:
+        _known.add(target)
+    return exists
+
+
+def record_derivatives(name):
+    # called once the derivatives of `name` are written, drops the cached no
+    targets = [derivative_name(name, size) for size in IMAGE_SIZES]
+    _known.update(targets)
+    cache.set_many({_exists_key(target): True for target in targets}, None)
+
+
+def generate_derivatives(name, force=False):
+    # Runs in a worker process, touches storage only (no DB)
+    with default_storage.open(name, "rb") as f:
+        original = Image.open(f)
+        original.load()
+
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA")
+
+    created = []
+    for size, width in IMAGE_SIZES.items():
+        target = derivative_name(name, size)
+
+        if default_storage.exists(target):
+            if not force:
+                continue
+            default_storage.delete(target)
+
+        image = original.copy()
+        image.thumbnail((width, width * 4))
+
+        buffer = BytesIO()
+        image.save(buffer, "WEBP", quality=80)
+        default_storage.save(target, ContentFile(buffer.getvalue()))
+        created.append(target)
+
+    return created
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2))
+    return _executor
+
+
+def _generated(name, future):
+    if future.exception() is not None:
+        logger.error("Image derivative generation failed", exc_info=future.exception())
+    else:
+        record_derivatives(name)
+
+
+def schedule_derivatives(name, force=False):
+    future = get_executor().submit(generate_derivatives, name, force)
+    future.add_done_callback(partial(_generated, name))
+    return future
@@ -0,0 +1,52 @@
+from django.utils.text import Truncator
+
+from .models import CatalogListing, Product
+
+LISTING_FIELDS = [
+    "brand_id", "brand_name", "title", "gender", "unit_price",
+    "in_stock", "summary", "image", "search_vector",
+]
+
+# same length the grid used to cut the description at
+SUMMARY_CHARS = 60
+
+
+def sync_listings(product_ids):
+    """
+    Upsert the CatalogListing rows of the given products from Product, and
+    drop the ones whose product is gone. Two statements for any batch size.
+    """
+    product_ids = list(product_ids)
+    rows = Product.objects.filter(pk__in=product_ids).values(
+        "id", "brand_id", "brand__name", "title", "gender", "unit_price",
+        "in_stock", "description", "image", "search_vector",
+    )
+
+    listings = [
+        CatalogListing(
+            id=row["id"],
+            brand_id=row["brand_id"],
+            brand_name=row["brand__name"],
+            title=row["title"],
+            gender=row["gender"],
+            unit_price=row["unit_price"],
+            in_stock=row["in_stock"],
+            summary=Truncator(row["description"]).chars(SUMMARY_CHARS),
+            image=row["image"],
+            search_vector=row["search_vector"],
+        )
+        for row in rows
+    ]
+
+    CatalogListing.objects.bulk_create(
+        listings,
+        update_conflicts=True,
+        unique_fields=["id"],
+        update_fields=LISTING_FIELDS,
+    )
+
+    gone = set(product_ids) - {listing.id for listing in listings}
+    if gone:
+        CatalogListing.objects.filter(pk__in=gone).delete()
+
+    return len(listings)
@@ -0,0 +1,39 @@
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from store.images import IMAGE_SIZES, generate_derivatives, get_executor, record_derivatives
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = f"Generate the {', '.join(IMAGE_SIZES)} derivatives for every product image."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="regenerate derivatives that already exist")
+
+    def handle(self, *args, **options):
+        names = (
+            Product.objects.exclude(image="").exclude(image__isnull=True)
+            .values_list("image", flat=True).distinct().iterator()
+        )
+
+        executor = get_executor()
+        futures = {executor.submit(generate_derivatives, name, options["force"]): name for name in names}
+
+        created = 0
+        failed = 0
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                created += len(future.result())
+                record_derivatives(futures[future])
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"failed: {e}")
+
+            if done % 100 == 0:
+                self.stdout.write(f"{done}/{len(futures)} images")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(futures)} images, {created} derivatives written, {failed} failed"
+        ))
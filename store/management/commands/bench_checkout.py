@@ -0,0 +1,127 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.urls import reverse
+from django.utils import timezone
+
+from store.bench_utils import bench_client, summarize
+from store.models import Brand, Cart, CartItem, Customer, Order, OrderItem, Product, ShippingAddress
+from store.rollups import rebuild_sales_rollups
+
+USERNAME_PREFIX = "bench-checkout-"
+# the benchmark's own brand is "bench-checkout-<uuid hex>", cleanup only ever
+# matches that exact shape so a real brand can't be taken with it
+BENCH_BRAND = r"^bench-checkout-[0-9a-f]{32}$"
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency benchmark for place_order: many shoppers check out the same "
+        "hot product at once. Reports throughput, latency and whether stock was oversold. "
+        "Run it against PostgreSQL, SQLite serializes all writers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shoppers", type=int, default=300)
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--stock", type=int, default=100, help="inventory of the hot product")
+        parser.add_argument("--quantity", type=int, default=1, help="units each shopper buys")
+        parser.add_argument("--keep", action="store_true", help="don't delete the benchmark rows")
+
+    def handle(self, *args, **options):
+        product, users = self.setup(options)
+        url = reverse("place-order")
+        success_url = reverse("checkout-success")
+
+        def checkout(user):
+            client = bench_client(user)
+            start = time.perf_counter()
+            response = client.post(url)
+            elapsed = time.perf_counter() - start
+            connections.close_all()
+            return elapsed, response.status_code == 302 and response.url == success_url
+
+        self.stdout.write(f"{len(users)} shoppers, {options['threads']} threads, stock {options['stock']}")
+
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            results = list(pool.map(checkout, users))
+        wall = time.perf_counter() - wall_start
+
+        product.refresh_from_db()
+        placed = sum(1 for _, ok in results if ok)
+        sold = placed * options["quantity"]
+        stats = summarize([elapsed for elapsed, _ in results], wall)
+
+        self.stdout.write(f"wall time:    {wall:.2f}s")
+        self.stdout.write(f"throughput:   {stats['throughput']} checkouts/s")
+        self.stdout.write(f"latency:      p50 {stats['p50_ms']}ms  p95 {stats['p95_ms']}ms  p99 {stats['p99_ms']}ms")
+        self.stdout.write(f"orders:       {placed} placed, {len(results) - placed} rejected")
+        self.stdout.write(f"inventory:    {product.inventory} left")
+
+        if sold > options["stock"] or product.inventory != options["stock"] - sold:
+            self.stdout.write(self.style.ERROR("OVERSOLD: inventory does not match orders"))
+        else:
+            self.stdout.write(self.style.SUCCESS("no oversell"))
+
+        if not options["keep"]:
+            self.cleanup()
+
+    def setup(self, options):
+        self.cleanup()
+
+        brand = Brand.objects.create(name=f"{USERNAME_PREFIX}{uuid.uuid4().hex}")
+        product = Product.objects.create(
+            brand=brand,
+            title="Bench hot product",
+            gender="unisex",
+            dial_color="black",
+            strap_color="black",
+            strap_material="steel",
+            size=40,
+            description="",
+            unit_price=Decimal("99.00"),
+            inventory=options["stock"],
+        )
+
+        User = get_user_model()
+        User.objects.bulk_create([
+            User(username=f"{USERNAME_PREFIX}{i}", email=f"{USERNAME_PREFIX}{i}@example.com")
+            for i in range(options["shoppers"])
+        ])
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX))
+
+        Cart.objects.bulk_create([Cart(user=user) for user in users])
+        carts = list(Cart.objects.filter(user__in=users))
+
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=options["quantity"]) for cart in carts
+        ])
+        ShippingAddress.objects.bulk_create([
+            ShippingAddress(user_id=cart.user_id, cart=cart, full_name="Bench", phone="0", city="Amman", street="Bench")
+            for cart in carts
+        ])
+        return product, users
+
+    def cleanup(self):
+        User = get_user_model()
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        customers = Customer.objects.filter(user__in=users)
+        first_order = Order.objects.filter(customer__in=customers).order_by("placed_at").first()
+
+        OrderItem.objects.filter(order__customer__in=customers).delete()
+        Order.objects.filter(customer__in=customers).delete()
+        customers.delete()
+        users.delete()
+
+        for brand in Brand.objects.filter(name__regex=BENCH_BRAND):
+            Product.objects.filter(brand=brand).delete()
+            brand.delete()
+
+        if first_order:
+            rebuild_sales_rollups(since=timezone.localdate(first_order.placed_at))
@@ -0,0 +1,69 @@
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.bench_utils import summarize
+
+DEFAULT_PATHS = ["/", "/?sort=price_asc", "/?gender=men"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test a running server over real HTTP. Start the app under gunicorn (WSGI) "
+        "or uvicorn (ASGI) first, run this against both and compare throughput and tail latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--path", action="append", dest="paths", help="repeatable, defaults to a few catalog pages")
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--cookie", default="", help="e.g. sessionid=... to hit the logged in pages")
+        parser.add_argument("--timeout", type=float, default=30.0)
+        parser.add_argument("--json", action="store_true", help="print the summary as json")
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or DEFAULT_PATHS
+        urls = [urljoin(options["base_url"], path) for path in paths]
+        headers = {"Cookie": options["cookie"]} if options["cookie"] else {}
+
+        def fetch(i):
+            request = urllib.request.Request(urls[i % len(urls)], headers=headers)
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=options["timeout"]) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as exc:
+                status = exc.code
+            except (urllib.error.URLError, TimeoutError):
+                status = None
+            return time.perf_counter() - start, status
+
+        # one warm-up request so a dead server fails fast instead of timing out N times
+        _, status = fetch(0)
+        if status is None:
+            raise CommandError(f"Could not reach {urls[0]}")
+
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            results = list(pool.map(fetch, range(options["requests"])))
+        wall = time.perf_counter() - wall_start
+
+        stats = summarize([elapsed for elapsed, _ in results], wall)
+        stats["concurrency"] = options["concurrency"]
+        stats["errors"] = sum(1 for _, status in results if status is None or status >= 500)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(stats))
+            return
+
+        self.stdout.write(f"{stats['requests']} requests, concurrency {stats['concurrency']}, {len(urls)} urls")
+        self.stdout.write(f"throughput:   {stats['throughput']} req/s")
+        self.stdout.write(f"latency:      p50 {stats['p50_ms']}ms  p95 {stats['p95_ms']}ms  p99 {stats['p99_ms']}ms")
+        self.stdout.write(f"errors:       {stats['errors']}")
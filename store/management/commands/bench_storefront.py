@@ -0,0 +1,192 @@
+import json
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import F, Sum
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils import timezone
+
+from store.bench_utils import ClientSession, HttpSession, summarize
+from store.catalog_cache import bump_catalog_version
+from store.filters import ALLOWED_GENDERS, canonical_query, parse_filters
+from store.listing import sync_listings
+from store.models import CatalogListing, Customer, Order, OrderItem, Product
+from store.rollups import rebuild_sales_rollups
+
+USERNAME_PREFIX = "bench-shopper-"
+STEPS = ["browse", "filter", "product", "add_to_cart", "address", "review", "place_order"]
+SORTS = ["", "price_asc", "price_desc", "title"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the browse -> filter -> product -> add to cart -> checkout flow with many "
+        "concurrent shoppers and report throughput and p50/p95/p99 per step. Runs in-process "
+        "through the test client, or against a running server with --base-url. Seed data "
+        "first with seed_store. Save runs with --output and diff them with --compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flows", type=int, default=200, help="shoppers, each runs the flow once")
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--base-url", help="e.g. http://127.0.0.1:8000, default is in-process")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", help="write the results to this JSON file")
+        parser.add_argument("--compare", help="a previous --output file to diff against")
+        parser.add_argument("--keep", action="store_true", help="keep the orders and shoppers afterwards")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        product_ids = list(CatalogListing.objects.filter(in_stock=True).values_list("id", flat=True))
+        if not product_ids:
+            raise CommandError("No products in stock, run `manage.py seed_store` first.")
+
+        users = self.create_shoppers(options["flows"])
+        plans = [self.plan(rng, product_ids) for _ in users]
+        base_url = options["base_url"]
+
+        def run(args):
+            user, plan = args
+            session = HttpSession(base_url, user) if base_url else ClientSession(user)
+            results = [(step, *session.request(method, path, data)) for step, method, path, data in plan]
+            connections.close_all()
+            return results
+
+        mode = base_url or "in-process"
+        self.stdout.write(f"{len(users)} flows, concurrency {options['concurrency']}, {mode}")
+
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            flows = list(pool.map(run, zip(users, plans)))
+        wall = time.perf_counter() - wall_start
+
+        report = self.report(flows, wall, options, mode)
+        self.print_report(report)
+
+        if options["compare"]:
+            self.print_comparison(report, options["compare"])
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"saved to {options['output']}")
+
+        if not options["keep"]:
+            self.cleanup()
+
+    def plan(self, rng, product_ids):
+        # the requests one shopper makes, decided up front so runs are repeatable
+        product_id = rng.choice(product_ids)
+        filters = parse_filters(QueryDict(mutable=True))
+        filters["gender"] = sorted(rng.sample(ALLOWED_GENDERS, rng.randint(1, 2)))
+        home = reverse("home")
+
+        return [
+            ("browse", "get", home, None),
+            ("filter", "get", f"{home}?{canonical_query(filters, sort=rng.choice(SORTS))}", None),
+            ("product", "get", reverse("product-detail", args=[product_id]), None),
+            ("add_to_cart", "post", reverse("cart-add", args=[product_id]), {"quantity": 1}),
+            ("address", "post", reverse("checkout-address"), {
+                "full_name": "Bench Shopper", "phone": "0790000000", "country": "Jordan",
+                "city": "Amman", "street": "Bench St",
+            }),
+            ("review", "get", reverse("checkout-review"), None),
+            ("place_order", "post", reverse("place-order"), None),
+        ]
+
+    def report(self, flows, wall, options, mode):
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+
+        for flow in flows:
+            for step, elapsed, status in flow:
+                latencies[step].append(elapsed)
+                if status is None or status >= 400:
+                    errors[step] += 1
+
+        steps = {}
+        for step in STEPS:
+            stats = summarize(latencies[step], wall)
+            stats["errors"] = errors[step]
+            steps[step] = stats
+
+        return {
+            "started_at": timezone.now().isoformat(),
+            "mode": mode,
+            "flows": len(flows),
+            "concurrency": options["concurrency"],
+            "seed": options["seed"],
+            "wall_seconds": round(wall, 2),
+            "flows_per_second": round(len(flows) / wall, 2) if wall else 0.0,
+            "steps": steps,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(f"{report['flows_per_second']} flows/s over {report['wall_seconds']}s")
+        self.stdout.write(f"{'step':<12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for step, stats in report["steps"].items():
+            self.stdout.write(
+                f"{step:<12} {stats['throughput']:>8} {stats['p50_ms']:>8} "
+                f"{stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats['errors']:>7}"
+            )
+
+    def print_comparison(self, report, path):
+        with open(path) as f:
+            previous = json.load(f)
+
+        def change(new, old):
+            if not old:
+                return "n/a"
+            return f"{(new - old) / old * 100:+.1f}%"
+
+        self.stdout.write(f"vs {path} ({previous.get('started_at', '?')})")
+        self.stdout.write(f"flows/s      {change(report['flows_per_second'], previous['flows_per_second'])}")
+        for step, stats in report["steps"].items():
+            old = previous["steps"].get(step)
+            if old:
+                self.stdout.write(
+                    f"{step:<12} p50 {change(stats['p50_ms'], old['p50_ms']):>8}  "
+                    f"p95 {change(stats['p95_ms'], old['p95_ms']):>8}  "
+                    f"p99 {change(stats['p99_ms'], old['p99_ms']):>8}"
+                )
+
+    def create_shoppers(self, count):
+        self.cleanup()
+        User = get_user_model()
+        User.objects.bulk_create([
+            User(username=f"{USERNAME_PREFIX}{i}", email=f"{USERNAME_PREFIX}{i}@example.com")
+            for i in range(count)
+        ])
+        return list(User.objects.filter(username__startswith=USERNAME_PREFIX))
+
+    @transaction.atomic
+    def cleanup(self):
+        User = get_user_model()
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        customers = Customer.objects.filter(user__in=users)
+        items = OrderItem.objects.filter(order__customer__in=customers)
+
+        # give the stock back so repeated runs see the same catalog
+        sold = dict(items.values("product_id").annotate(total=Sum("quantity")).values_list("product_id", "total"))
+        for product_id, quantity in sold.items():
+            Product.objects.filter(id=product_id).update(inventory=F("inventory") + quantity, in_stock=True)
+        if sold:
+            sync_listings(sold.keys())
+            bump_catalog_version()
+
+        first_order = Order.objects.filter(customer__in=customers).order_by("placed_at").first()
+
+        items.delete()
+        Order.objects.filter(customer__in=customers).delete()
+        customers.delete()
+        users.delete()
+
+        if first_order:
+            # take the benchmark orders back out of the reporting rollups
+            rebuild_sales_rollups(since=timezone.localdate(first_order.placed_at))
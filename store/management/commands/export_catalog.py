@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.db_routing import replica_reads
+from store.feeds import FEED_FORMATS, buffered, feed_chunks, feed_rows, gzip_chunks, parse_since
+
+
+class Command(BaseCommand):
+    help = "Write the catalog feed (CSV or JSON Lines) to a file or stdout, in constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=list(FEED_FORMATS), default="csv")
+        parser.add_argument("--since", help="only products changed after this date/datetime")
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("--output", "-o", help="file path, default stdout")
+        parser.add_argument("--base-url", default="", help="prefix for image URLs, e.g. https://shop.example.com")
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_since(options["since"])
+        except ValueError as e:
+            raise CommandError(e)
+
+        rows = feed_rows(since=since, base_url=options["base_url"].rstrip("/"))
+        chunks = buffered(feed_chunks(options["format"], rows))
+        if options["gzip"]:
+            chunks = gzip_chunks(chunks)
+
+        out = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        try:
+            # a long read-only scan, keep it off the primary when we can
+            with replica_reads():
+                for chunk in chunks:
+                    out.write(chunk)
+        finally:
+            if options["output"]:
+                out.close()
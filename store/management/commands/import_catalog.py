@@ -0,0 +1,258 @@
+import csv
+import hashlib
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from store.catalog_cache import bump_catalog_version
+from store.filters import ALLOWED_GENDERS
+from store.images import schedule_derivatives
+from store.listing import sync_listings
+from store.models import Brand, Product
+from store.search import refresh_search_vectors
+
+# columns written on update, besides sku
+PRODUCT_FIELDS = [
+    "brand", "title", "gender", "dial_color", "strap_color", "strap_material",
+    "size", "description", "unit_price", "inventory", "in_stock", "last_update",
+]
+TRUE_VALUES = {"1", "true", "yes", "y"}
+# columns that must not go below zero, on top of the field limits
+NON_NEGATIVE = ("size", "unit_price", "inventory")
+# hex digits of the content hash put in stored image names
+IMAGE_DIGEST_LENGTH = 12
+
+
+def image_name(filename, digest):
+    # foo.jpg -> products/foo_<hash>.jpg: the same file always gets the same
+    # name (a re-import uploads nothing), another supplier's foo.jpg never
+    # lands on it
+    stem, ext = os.path.splitext(os.path.basename(filename))
+    return f"products/{stem}_{digest[:IMAGE_DIGEST_LENGTH]}{ext}"
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a CSV or JSON Lines catalog into Brand/Product. Brands are matched "
+        "by name, products are upserted on sku in batches. Columns: sku, title, brand, "
+        "gender, dial_color, strap_color, strap_material, size, description, unit_price, "
+        "inventory, [in_stock], [image]."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--images", help="directory holding the files named in the image column")
+        parser.add_argument("--dry-run", action="store_true", help="validate and count, write nothing")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+        self.images_dir = options["images"]
+        self.dry_run = options["dry_run"]
+        self.brands = {}
+        self.stats = {"rows": 0, "created": 0, "updated": 0, "skipped": 0, "brands": 0, "images": 0}
+
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+
+        start = time.perf_counter()
+        for batch in batched(self.read_rows(path, fmt), options["batch_size"]):
+            self.import_batch(batch)
+
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{self.stats['rows']} rows ({self.stats['rows'] / elapsed:.0f}/s), "
+                f"{self.stats['created']} new, {self.stats['updated']} updated, {self.stats['skipped']} skipped"
+            )
+
+        if not self.dry_run:
+            bump_catalog_version()
+
+        prefix = "[dry run] " if self.dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{self.stats['rows']} rows in {time.perf_counter() - start:.1f}s: "
+            f"{self.stats['created']} created, {self.stats['updated']} updated, "
+            f"{self.stats['skipped']} skipped, {self.stats['brands']} new brands, "
+            f"{self.stats['images']} images attached"
+        ))
+
+    def read_rows(self, path, fmt):
+        # generators all the way down, memory stays flat whatever the file size;
+        # utf-8-sig drops the BOM Excel puts in front of the first header
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            if fmt == "csv":
+                for line_no, row in enumerate(csv.DictReader(f), start=2):
+                    yield line_no, row
+            else:
+                for line_no, line in enumerate(f, start=1):
+                    if line.strip():
+                        try:
+                            yield line_no, json.loads(line)
+                        except ValueError as e:
+                            self.stderr.write(f"line {line_no}: invalid JSON ({e})")
+
+    def clean(self, line_no, row):
+        try:
+            sku = str(row["sku"]).strip()
+            gender = str(row["gender"]).strip().lower()
+            if not sku:
+                raise ValueError("empty sku")
+            if not str(row["brand"]).strip():
+                raise ValueError("empty brand")
+            if gender not in ALLOWED_GENDERS:
+                raise ValueError(f"unknown gender {gender!r}")
+
+            inventory = int(row["inventory"])
+            in_stock = row.get("in_stock")
+            in_stock = inventory > 0 if in_stock in (None, "") else str(in_stock).strip().lower() in TRUE_VALUES
+
+            row = {
+                "sku": sku,
+                "brand": str(row["brand"]).strip(),
+                "title": str(row["title"]).strip(),
+                "gender": gender,
+                "dial_color": str(row.get("dial_color") or ""),
+                "strap_color": str(row.get("strap_color") or ""),
+                "strap_material": str(row.get("strap_material") or ""),
+                "size": int(row["size"]),
+                "description": str(row.get("description") or ""),
+                "unit_price": Decimal(str(row["unit_price"])).quantize(Decimal("0.01")),
+                "inventory": inventory,
+                "in_stock": in_stock,
+                "image": str(row.get("image") or "").strip(),
+            }
+            self.validate(row)
+            return row
+        except (KeyError, ValueError, TypeError, InvalidOperation, ValidationError) as e:
+            self.stderr.write(f"line {line_no}: skipped ({e!r})")
+            return None
+
+    def validate(self, row):
+        # The model's own validators (max_length, max_digits, the integer
+        # column ranges), so a bad row is skipped here instead of failing
+        # the whole batch with a DataError - and --dry-run sees it too.
+        values = {
+            field: row[field] for field in PRODUCT_FIELDS if field not in ("brand", "in_stock", "last_update")
+        }
+        values["sku"] = row["sku"]
+        for name, value in values.items():
+            try:
+                Product._meta.get_field(name).run_validators(value)
+            except ValidationError as e:
+                raise ValidationError(f"{name}: {'; '.join(e.messages)}")
+        Brand._meta.get_field("name").run_validators(row["brand"])
+
+        for name in NON_NEGATIVE:
+            if row[name] < 0:
+                raise ValueError(f"negative {name}")
+        image_length = len(image_name(row["image"], "0" * IMAGE_DIGEST_LENGTH))
+        if row["image"] and image_length > Product._meta.get_field("image").max_length:
+            raise ValueError("image file name too long")
+
+    def import_batch(self, batch):
+        rows = {}
+        for line_no, raw in batch:
+            self.stats["rows"] += 1
+            row = self.clean(line_no, raw)
+            if row is None:
+                self.stats["skipped"] += 1
+            else:
+                rows[row["sku"]] = row  # a later line with the same sku wins
+
+        existing = set(Product.objects.filter(sku__in=rows).values_list("sku", flat=True))
+        self.stats["updated"] += len(existing)
+        self.stats["created"] += len(rows) - len(existing)
+
+        if self.dry_run:
+            names = {row["brand"] for row in rows.values()} - set(self.brands)
+            known = set(Brand.objects.filter(name__in=names).values_list("name", flat=True))
+            self.stats["brands"] += len(names - known)
+            self.brands.update(dict.fromkeys(names))
+            return
+
+        with transaction.atomic():
+            self.import_rows(rows)
+
+    def import_rows(self, rows):
+        self.upsert_brands({row["brand"] for row in rows.values()})
+
+        images = {}
+        products = []
+        for row in rows.values():
+            product = Product(
+                sku=row["sku"],
+                brand_id=self.brands[row["brand"]],
+                **{field: row[field] for field in PRODUCT_FIELDS if field not in ("brand", "last_update")},
+            )
+            if row["image"] and self.images_dir:
+                name = self.attach_image(row["image"])
+                if name:
+                    product.image = name
+                    images[row["sku"]] = name
+            products.append(product)
+
+        # image stays out of the upsert: only rows that attached a file may
+        # change it, the others keep whatever image they already had
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=["sku"],
+            update_fields=PRODUCT_FIELDS,
+        )
+        if images:
+            ids = dict(Product.objects.filter(sku__in=images).values_list("sku", "id"))
+            Product.objects.bulk_update(
+                [Product(id=ids[sku], image=name) for sku, name in images.items()], ["image"]
+            )
+
+        # bulk_create skips signals, so do what they would: search, listing, images
+        imported = Product.objects.filter(sku__in=rows)
+        refresh_search_vectors(imported)
+        sync_listings(imported.values_list("id", flat=True))
+
+        for name in images.values():
+            transaction.on_commit(lambda name=name: schedule_derivatives(name))
+
+    def upsert_brands(self, names):
+        missing = names - set(self.brands)
+        if not missing:
+            return
+
+        for brand in Brand.objects.filter(name__in=missing):
+            self.brands[brand.name] = brand.id
+
+        new = [Brand(name=name) for name in missing - set(self.brands)]
+        for brand in Brand.objects.bulk_create(new):
+            self.brands[brand.name] = brand.id
+        self.stats["brands"] += len(new)
+
+    def attach_image(self, filename):
+        source = os.path.join(self.images_dir, os.path.basename(filename))
+        if not os.path.exists(source):
+            self.stderr.write(f"image not found: {source}")
+            return None
+
+        with open(source, "rb") as f:
+            name = image_name(filename, hashlib.file_digest(f, "sha256").hexdigest())
+            if default_storage.exists(name):
+                return name
+            f.seek(0)
+            name = default_storage.save(name, File(f))
+        self.stats["images"] += 1
+        return name
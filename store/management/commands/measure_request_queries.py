@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from django.urls import reverse
+
+from store.bench_utils import bench_client
+from store.cart_utils import add_to_cart, get_or_create_cart
+from store.models import CatalogListing, Customer, ShippingAddress
+from store.query_budget import record_queries
+
+USERNAME = "query-probe"
+
+# the stock setup: sessions in the DB, request.user loaded on every request
+DB_SESSIONS = {
+    "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+    "AUTH_MIDDLEWARE": "django.contrib.auth.middleware.AuthenticationMiddleware",
+}
+CACHED = {
+    "SESSION_ENGINE": "django.contrib.sessions.backends.cached_db",
+    "AUTH_MIDDLEWARE": "store.auth_cache.CachedAuthenticationMiddleware",
+}
+AUTH_MIDDLEWARE = {DB_SESSIONS["AUTH_MIDDLEWARE"], CACHED["AUTH_MIDDLEWARE"]}
+
+
+class Command(BaseCommand):
+    help = (
+        "Count the queries per request on the main storefront pages for a logged in "
+        "shopper, with database sessions + the stock auth middleware and with cached "
+        "sessions + the cached user, and show how many of them were session/auth reads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="warm requests per page")
+
+    def handle(self, *args, **options):
+        product_ids = list(CatalogListing.objects.filter(in_stock=True).values_list("id", flat=True)[:3])
+        if not product_ids:
+            raise CommandError("No products in stock, run `manage.py seed_store` first.")
+
+        user = self.create_shopper(product_ids)
+        pages = [
+            ("home", reverse("home")),
+            ("product", reverse("product-detail", args=[product_ids[0]])),
+            ("cart", reverse("cart-detail")),
+            ("review", reverse("checkout-review")),
+        ]
+
+        try:
+            results = {
+                name: self.measure(config, user, pages, options["repeat"])
+                for name, config in (("db", DB_SESSIONS), ("cached", CACHED))
+            }
+        finally:
+            self.cleanup()
+
+        self.stdout.write(f"queries per warm request, mean of {options['repeat']}, (session/auth part)")
+        self.stdout.write(f"{'page':<10} {'db sessions':>14} {'cached':>14} {'saved':>7}")
+        for page, _ in pages:
+            db, cached = results["db"][page], results["cached"][page]
+            self.stdout.write(
+                f"{page:<10} {db[0]:>8.1f} ({db[1]:.1f}) {cached[0]:>8.1f} ({cached[1]:.1f}) "
+                f"{db[0] - cached[0]:>7.1f}"
+            )
+
+    def measure(self, config, user, pages, repeat):
+        middleware = [
+            config["AUTH_MIDDLEWARE"] if path in AUTH_MIDDLEWARE else path for path in settings.MIDDLEWARE
+        ]
+        tables = [f'"{model._meta.db_table}"' for model in (Session, get_user_model(), Customer)]
+        results = {}
+
+        with override_settings(SESSION_ENGINE=config["SESSION_ENGINE"], MIDDLEWARE=middleware):
+            client = bench_client(user)
+            for page, url in pages:
+                client.get(url)  # fill the caches first
+                total = auth = 0
+                for _ in range(repeat):
+                    with record_queries() as recorder:
+                        client.get(url)
+                    total += recorder.count
+                    auth += sum(any(table in sql for table in tables) for sql, _ in recorder.queries)
+                results[page] = (total / repeat, auth / repeat)
+
+        return results
+
+    @transaction.atomic
+    def create_shopper(self, product_ids):
+        self.cleanup()
+        user = get_user_model().objects.create_user(USERNAME, f"{USERNAME}@example.com")
+        cart = get_or_create_cart(user)
+        for product_id in product_ids:
+            add_to_cart(cart, product_id, 1)
+        ShippingAddress.objects.create(
+            user=user, cart=cart, full_name="Query Probe", phone="0790000000", city="Amman", street="Main"
+        )
+        return user
+
+    def cleanup(self):
+        # carts and addresses go with the user
+        get_user_model().objects.filter(username=USERNAME).delete()
@@ -0,0 +1,129 @@
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+from django.utils import timezone
+
+from store.models import Cart
+from store.pruning import prune_cart_batch
+
+COUNTS = ("carts", "items", "addresses", "archived")
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete abandoned OPENED carts and old FROZEN carts in small batches (keyset over id, "
+        "one short transaction each), optionally archiving them first. Safe to run during "
+        "traffic: carts a request has locked are skipped and lock waits are capped. "
+        "FROZEN carts hold the shipping address of their order, so they are archived "
+        "first unless --no-archive is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--opened-days", type=int, default=90, help="untouched this long, 0 skips them")
+        parser.add_argument("--frozen-days", type=int, default=180, help="0 skips them")
+        archive = parser.add_mutually_exclusive_group()
+        archive.add_argument("--archive", action="store_true", help="archive OPENED carts too, not just FROZEN ones")
+        archive.add_argument(
+            "--no-archive", action="store_true", help="archive nothing, FROZEN carts' shipping addresses are lost"
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--sleep", type=float, default=0.1, help="seconds between batches")
+        parser.add_argument("--lock-timeout", type=float, default=2.0, help="seconds, per statement")
+        parser.add_argument("--retries", type=int, default=3, help="per batch, after a lock timeout")
+        parser.add_argument("--max-batches", type=int, help="stop after this many batches in total")
+        parser.add_argument("--max-seconds", type=float, help="stop after this long")
+        parser.add_argument("--dry-run", action="store_true", help="only count what would go")
+        parser.add_argument("--json", action="store_true", help="print the metrics as json")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        now = timezone.now()
+        targets = [
+            (status, now - timedelta(days=days))
+            for status, days in ((Cart.Status.OPENED, options["opened_days"]), (Cart.Status.FROZEN, options["frozen_days"]))
+            if days > 0
+        ]
+
+        if options["dry_run"]:
+            for status, cutoff in targets:
+                count = Cart.objects.filter(status=status, updated_at__lt=cutoff).count()
+                self.stdout.write(f"{status}: {count} carts untouched since {cutoff:%Y-%m-%d}")
+            return
+
+        self.start = time.perf_counter()
+        self.batches = 0
+        metrics = {status: self.prune(status, cutoff, options) for status, cutoff in targets}
+
+        if options["json"]:
+            self.stdout.write(json.dumps(metrics, indent=2))
+        else:
+            for status, stats in metrics.items():
+                self.stdout.write(self.style.SUCCESS(
+                    f"{status}: {stats['carts']} carts, {stats['items']} items, {stats['addresses']} addresses "
+                    f"removed ({stats['archived']} archived) in {stats['batches']} batches, "
+                    f"{stats['seconds']}s, {stats['carts_per_second']} carts/s, "
+                    f"longest batch {stats['max_batch_ms']}ms, {stats['lock_timeouts']} lock timeouts"
+                    + (" (stopped early)" if stats["stopped_early"] else "")
+                ))
+
+    def archive(self, status, options):
+        # a FROZEN cart's address is the only copy of where its order went
+        if options["no_archive"]:
+            return False
+        return options["archive"] or status == Cart.Status.FROZEN
+
+    def out_of_budget(self, options):
+        if options["max_batches"] is not None and self.batches >= options["max_batches"]:
+            return True
+        return options["max_seconds"] is not None and time.perf_counter() - self.start >= options["max_seconds"]
+
+    def prune(self, status, cutoff, options):
+        stats = dict.fromkeys(COUNTS, 0)
+        stats.update(batches=0, lock_timeouts=0, max_batch_ms=0.0, stopped_early=False)
+        started = time.perf_counter()
+        after_id = failures = 0
+
+        while True:
+            if self.out_of_budget(options):
+                stats["stopped_early"] = True
+                break
+
+            batch_start = time.perf_counter()
+            try:
+                result = prune_cart_batch(
+                    status, cutoff, after_id=after_id, batch_size=options["batch_size"],
+                    archive=self.archive(status, options), lock_timeout=options["lock_timeout"],
+                )
+            except OperationalError as e:
+                # rolled back, back off and try the same batch again
+                stats["lock_timeouts"] += 1
+                failures += 1
+                if failures > options["retries"]:
+                    raise CommandError(f"{status} batch after id {after_id} keeps failing: {e}")
+                time.sleep(max(options["sleep"], 0.1) * 2 ** failures)
+                continue
+
+            if result is None:
+                break
+
+            failures = 0
+            after_id = result["last_id"]
+            for key in COUNTS:
+                stats[key] += result[key]
+            stats["batches"] += 1
+            self.batches += 1
+            stats["max_batch_ms"] = max(stats["max_batch_ms"], round((time.perf_counter() - batch_start) * 1000, 1))
+
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{status} up to id {after_id}: {result['carts']} carts, {result['items']} items")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        stats["seconds"] = round(time.perf_counter() - started, 2)
+        stats["carts_per_second"] = round(stats["carts"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+        return stats
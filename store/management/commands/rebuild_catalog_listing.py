@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.catalog_cache import bump_catalog_version
+from store.listing import sync_listings
+from store.models import CatalogListing, Product
+
+
+class Command(BaseCommand):
+    help = "Rebuild the CatalogListing read model from Product, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        synced = 0
+        last_id = 0
+
+        while True:
+            ids = list(
+                Product.objects.filter(id__gt=last_id).order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            with transaction.atomic():
+                synced += sync_listings(ids)
+            last_id = ids[-1]
+            self.stdout.write(f"{synced} listings synced")
+
+        orphans, _ = CatalogListing.objects.exclude(id__in=Product.objects.values("id")).delete()
+        bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(f"{synced} listings synced, {orphans} orphans removed"))
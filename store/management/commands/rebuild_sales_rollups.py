@@ -0,0 +1,30 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.rollups import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenerate the daily product/brand sales rollups from the order lines. "
+        "place_order keeps them current, run this after editing or deleting orders by hand."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="YYYY-MM-DD, only rebuild from this day on")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = date.fromisoformat(options["since"])
+            except ValueError:
+                raise CommandError("--since must be YYYY-MM-DD")
+
+        start = time.perf_counter()
+        products, brands = rebuild_sales_rollups(since=since)
+        self.stdout.write(self.style.SUCCESS(
+            f"{products} product rows, {brands} brand rows in {time.perf_counter() - start:.1f}s"
+        ))
@@ -0,0 +1,270 @@
+import math
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from store.catalog_cache import bump_catalog_version
+from store.listing import sync_listings
+from store.models import (
+    Brand, Cart, CartItem, Customer, Order, OrderItem, Product, ShippingAddress,
+)
+from store.rollups import rebuild_sales_rollups
+from store.search import refresh_search_vectors
+
+SKU_PREFIX = "SEED-"
+USERNAME_PREFIX = "seed-user-"
+PASSWORD = "storefront"
+
+BRAND_WORDS = [
+    "Aurel", "Brixton", "Calder", "Delmar", "Everest", "Falcon", "Garnet", "Halden", "Ivory",
+    "Jasper", "Kestrel", "Lumen", "Meridian", "Nordic", "Orion", "Pioneer", "Quartz", "Ravel",
+    "Sterling", "Tidal", "Umber", "Vantage", "Westbury", "Zenith",
+]
+MODEL_WORDS = [
+    "Chronograph", "Diver", "Field", "Pilot", "Dress", "GMT", "Skeleton", "Explorer",
+    "Moonphase", "Racer", "Classic", "Heritage",
+]
+DIAL_COLORS = ["black", "white", "blue", "green", "silver", "champagne", "grey"]
+STRAPS = [("leather", "brown"), ("leather", "black"), ("steel", "silver"), ("rubber", "black"), ("nylon", "olive")]
+CITIES = ["Amman", "Irbid", "Zarqa", "Aqaba", "Madaba", "Salt"]
+GENDERS = (["men", "women", "unisex"], [45, 40, 15])
+LINE_QUANTITIES = ([1, 2, 3, 4], [70, 20, 7, 3])
+MAX_PRICE = Decimal("9999.99")
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a realistic store for load testing: brands, products with log-normal "
+        "prices and Zipf popularity, users, open carts with items and a year of orders. "
+        f"Seeded users log in with the password '{PASSWORD}'. Use --clear to remove a previous run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--brands", type=int, default=20)
+        parser.add_argument("--products", type=int, default=2000)
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--carts", type=int, default=200, help="users with an open cart")
+        parser.add_argument("--orders", type=int, default=2000)
+        parser.add_argument("--days", type=int, default=365, help="order history spread")
+        parser.add_argument("--seed", type=int, default=42, help="random seed, same seed = same store")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--clear", action="store_true", help="remove seeded rows first")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        start = time.perf_counter()
+
+        if options["clear"]:
+            self.clear()
+
+        with transaction.atomic():
+            brands = self.create_brands(options["brands"])
+            products = self.create_products(brands, options["products"])
+            users = self.create_users(options["users"])
+
+            # a few products sell a lot, most sell a little
+            self.popularity = [1 / (rank + 1) ** 1.1 for rank in range(len(products))]
+            self.rng.shuffle(products)
+            self.products = products
+
+            carts = self.create_carts(users, options["carts"])
+            orders = self.create_orders(users, options["orders"], options["days"])
+
+            # orders were bulk inserted, not placed, so build the reporting rollups
+            rebuild_sales_rollups()
+
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(brands)} brands, {len(products)} products, {len(users)} users, "
+            f"{carts} carts, {orders} orders in {time.perf_counter() - start:.1f}s"
+        ))
+
+    def pick_products(self, count):
+        # weighted by popularity, no duplicates in one cart/order
+        picked = {}
+        while len(picked) < count:
+            product = self.rng.choices(self.products, weights=self.popularity)[0]
+            picked[product.id] = product
+        return list(picked.values())
+
+    def line_count(self):
+        # geometric: most baskets hold one or two watches
+        count = 1
+        while count < 6 and self.rng.random() < 0.4:
+            count += 1
+        return count
+
+    def quantity(self):
+        return self.rng.choices(*LINE_QUANTITIES)[0]
+
+    def price(self):
+        price = Decimal(math.exp(self.rng.gauss(math.log(180), 0.7))).quantize(Decimal("1")) - Decimal("0.01")
+        return min(max(price, Decimal("19.99")), MAX_PRICE)
+
+    def create_brands(self, count):
+        names = [
+            f"{self.rng.choice(BRAND_WORDS)} {i}" if i >= len(BRAND_WORDS) else BRAND_WORDS[i]
+            for i in range(count)
+        ]
+        existing = {brand.name: brand for brand in Brand.objects.filter(name__in=names)}
+        Brand.objects.bulk_create([Brand(name=name) for name in names if name not in existing])
+        return list(Brand.objects.filter(name__in=names))
+
+    def create_products(self, brands, count):
+        offset = Product.objects.filter(sku__startswith=SKU_PREFIX).count()
+        products = []
+
+        for i in range(offset, offset + count):
+            brand = self.rng.choice(brands)
+            material, strap_color = self.rng.choice(STRAPS)
+            dial = self.rng.choice(DIAL_COLORS)
+            model = self.rng.choice(MODEL_WORDS)
+            inventory = 0 if self.rng.random() < 0.05 else self.rng.randint(1, 200)
+
+            products.append(Product(
+                sku=f"{SKU_PREFIX}{i:07d}",
+                brand=brand,
+                title=f"{brand.name} {model} {dial.title()} {self.rng.randint(36, 46)}mm",
+                gender=self.rng.choices(*GENDERS)[0],
+                dial_color=dial,
+                strap_color=strap_color,
+                strap_material=material,
+                size=self.rng.randint(34, 46),
+                description=(
+                    f"A {model.lower()} watch by {brand.name} with a {dial} dial on a "
+                    f"{strap_color} {material} strap. {self.rng.choice([50, 100, 200, 300])}m water resistance."
+                ),
+                unit_price=self.price(),
+                inventory=inventory,
+                in_stock=inventory > 0,
+            ))
+
+        Product.objects.bulk_create(products, batch_size=self.batch_size)
+
+        # bulk_create skips the post_save signals, build search + listing rows in bulk
+        seeded = Product.objects.filter(sku__in=[p.sku for p in products])
+        refresh_search_vectors(seeded)
+        ids = list(seeded.values_list("id", flat=True))
+        for start in range(0, len(ids), self.batch_size):
+            sync_listings(ids[start:start + self.batch_size])
+
+        self.stdout.write(f"{len(products)} products")
+        return list(seeded)
+
+    def create_users(self, count):
+        User = get_user_model()
+        offset = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        password = make_password(PASSWORD)  # hash once, not per user
+
+        users = [
+            User(
+                username=f"{USERNAME_PREFIX}{i:06d}",
+                email=f"{USERNAME_PREFIX}{i:06d}@example.com",
+                password=password,
+                date_joined=timezone.now() - timedelta(days=self.rng.randint(0, 3 * 365)),
+            )
+            for i in range(offset, offset + count)
+        ]
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+        self.stdout.write(f"{len(users)} users")
+        return list(User.objects.filter(username__in=[u.username for u in users]))
+
+    def create_carts(self, users, count):
+        # at most one open cart per user
+        shoppers = self.rng.sample(users, min(count, len(users)))
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in shoppers], batch_size=self.batch_size)
+
+        items = []
+        addresses = []
+        for cart in carts:
+            for product in self.pick_products(self.line_count()):
+                items.append(CartItem(cart=cart, product=product, quantity=self.quantity()))
+
+            if self.rng.random() < 0.5:  # half of them got as far as the address step
+                addresses.append(ShippingAddress(
+                    user_id=cart.user_id,
+                    cart=cart,
+                    full_name=f"Shopper {cart.user_id}",
+                    phone=f"07{self.rng.randint(10000000, 99999999)}",
+                    city=self.rng.choice(CITIES),
+                    street=f"{self.rng.randint(1, 200)} Main St",
+                ))
+
+        CartItem.objects.bulk_create(items, batch_size=self.batch_size)
+        ShippingAddress.objects.bulk_create(addresses, batch_size=self.batch_size)
+        self.stdout.write(f"{len(carts)} carts, {len(items)} cart lines")
+        return len(carts)
+
+    def create_orders(self, users, count, days):
+        if not count:
+            return 0
+
+        # repeat buyers: a small share of users places most of the orders
+        buyer_weights = [1 / (rank + 1) ** 0.8 for rank in range(len(users))]
+        buyers = {user.id: user for user in self.rng.choices(users, weights=buyer_weights, k=count)}
+        existing = set(Customer.objects.filter(user_id__in=buyers).values_list("user_id", flat=True))
+
+        Customer.objects.bulk_create([
+            Customer(
+                user=user,
+                first_name=f"Seed{user.id}",
+                last_name="Shopper",
+                email=user.email,
+                phone=f"07{self.rng.randint(10000000, 99999999)}",
+            )
+            for user in buyers.values()
+            if user.id not in existing
+        ], batch_size=self.batch_size)
+        customers = list(Customer.objects.filter(user_id__in=buyers))
+
+        now = timezone.now()
+        statuses = ([Order.COMPLETE, Order.PENDING, Order.FAILED], [90, 7, 3])
+        orders = Order.objects.bulk_create([
+            Order(customer=self.rng.choice(customers), payment_status=self.rng.choices(*statuses)[0])
+            for _ in range(count)
+        ], batch_size=self.batch_size)
+
+        # placed_at is auto_now_add, spread the history afterwards
+        for order in orders:
+            order.placed_at = now - timedelta(seconds=self.rng.randint(0, days * 86400))
+        Order.objects.bulk_update(orders, ["placed_at"], batch_size=self.batch_size)
+
+        lines = [
+            OrderItem(order=order, product=product, quantity=self.quantity(), unit_price=product.unit_price)
+            for order in orders
+            for product in self.pick_products(self.line_count())
+        ]
+        OrderItem.objects.bulk_create(lines, batch_size=self.batch_size)
+        self.stdout.write(f"{len(orders)} orders, {len(lines)} order lines")
+        return len(orders)
+
+    def clear(self):
+        User = get_user_model()
+        products = Product.objects.filter(sku__startswith=SKU_PREFIX)
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        customers = Customer.objects.filter(user__in=users)
+        brand_ids = set(products.values_list("brand_id", flat=True))
+        product_ids = list(products.values_list("id", flat=True))
+
+        with transaction.atomic():
+            OrderItem.objects.filter(order__customer__in=customers).delete()
+            OrderItem.objects.filter(product_id__in=product_ids).delete()
+            Order.objects.filter(customer__in=customers).delete()
+            customers.delete()
+            CartItem.objects.filter(product_id__in=product_ids).delete()
+            users.delete()
+
+            products.delete()
+            Brand.objects.filter(id__in=brand_ids, product__isnull=True).delete()
+            rebuild_sales_rollups()
+
+        bump_catalog_version()
+        self.stdout.write(f"cleared {len(product_ids)} seeded products")
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:03
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# What store.search.product_search_vector() built when this migration was
+# written, kept here as SQL so later changes to that module don't change
+# what this migration does
+FILL_SEARCH_VECTORS = """
+UPDATE store_product AS p SET search_vector =
+    setweight(to_tsvector('english', COALESCE(p.title, '')), 'A')
+    || setweight(to_tsvector('english', COALESCE(b.name, '')), 'B')
+    || setweight(to_tsvector('english', CONCAT_WS(' ', p.dial_color, p.strap_color, p.strap_material)), 'C')
+    || setweight(to_tsvector('english', COALESCE(p.description, '')), 'D')
+FROM store_brand AS b
+WHERE b.id = p.brand_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_product_product_price_id_idx_and_more'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='product_title_trgm_gin', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunSQL(FILL_SEARCH_VECTORS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:41
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def fill_listings(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    CatalogListing = apps.get_model('store', 'CatalogListing')
+
+    batch = []
+    for product in Product.objects.select_related('brand').iterator(chunk_size=2000):
+        batch.append(CatalogListing(
+            id=product.id,
+            brand_id=product.brand_id,
+            brand_name=product.brand.name,
+            title=product.title,
+            gender=product.gender,
+            unit_price=product.unit_price,
+            in_stock=product.in_stock,
+            summary=Truncator(product.description).chars(60),
+            image=product.image.name if product.image else None,
+            search_vector=product.search_vector,
+        ))
+        if len(batch) == 2000:
+            CatalogListing.objects.bulk_create(batch)
+            batch = []
+
+    CatalogListing.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogListing',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('brand_id', models.BigIntegerField()),
+                ('brand_name', models.CharField(max_length=100)),
+                ('title', models.CharField(max_length=255)),
+                ('gender', models.CharField(choices=[('men', 'Men'), ('women', 'Women'), ('unisex', 'Unisex')], max_length=10)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('in_stock', models.BooleanField(default=True)),
+                ('summary', models.CharField(blank=True, max_length=80)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='products/')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['brand_id', 'gender'], name='listing_brand_gender_idx'),
+                    models.Index(fields=['unit_price', 'id'], name='listing_price_id_idx'),
+                    models.Index(fields=['title', 'id'], name='listing_title_id_idx'),
+                    django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='listing_search_vector_gin'),
+                    django.contrib.postgres.indexes.GinIndex(fields=['title'], name='listing_title_trgm_gin', opclasses=['gin_trgm_ops']),
+                ],
+            },
+        ),
+        migrations.RunPython(fill_listings, migrations.RunPython.noop),
+    ]
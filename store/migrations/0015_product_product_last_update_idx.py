@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_product_sku'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['last_update'], name='product_last_update_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_rollups(apps, schema_editor):
+    OrderItem = apps.get_model('store', 'OrderItem')
+    ProductDailySales = apps.get_model('store', 'ProductDailySales')
+    BrandDailySales = apps.get_model('store', 'BrandDailySales')
+
+    for model, key, field in (
+        (ProductDailySales, 'product_id', 'product_id'),
+        (BrandDailySales, 'product__brand_id', 'brand_id'),
+    ):
+        rows = (
+            OrderItem.objects.annotate(day=TruncDate('order__placed_at'))
+            .values('day', key)
+            .annotate(
+                units=Sum('quantity'),
+                revenue=Sum(F('quantity') * F('unit_price')),
+                orders=Count('order_id', distinct=True),
+            )
+            .order_by()
+        )
+        model.objects.bulk_create([
+            model(day=row['day'], units=row['units'], revenue=row['revenue'], orders=row['orders'], **{field: row[key]})
+            for row in rows
+        ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_product_product_last_update_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrandDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('brand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='store.brand')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'brand'), name='unique_brand_day_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='store.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'product'), name='unique_product_day_sales')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
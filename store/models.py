@@ -1,6 +1,12 @@
+from decimal import Decimal
+
 from django.db import models
 from django.conf import settings
-from django.db.models import Q
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import F, Q, Sum
+from django.utils.functional import cached_property
 
 
 class Brand(models.Model):
@@ -27,6 +33,8 @@ class Product(models.Model):
 
     brand = models.ForeignKey(Brand, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
+    # supplier stock-keeping unit, the key catalog imports upsert on
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
 
     gender = models.CharField(max_length=10, choices=GENDER_CHOICES)
     dial_color = models.CharField(max_length=50)
@@ -43,6 +51,50 @@ class Product(models.Model):
     last_update = models.DateTimeField(auto_now=True)
     image = models.ImageField(upload_to="products/", blank=True, null=True)
 
+    # maintained by store.signals / store.search, never edited by hand
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        # keyset pagination seeks on (sort key, id) for each catalog sort
+        indexes = [
+            models.Index(fields=["unit_price", "id"], name="product_price_id_idx"),
+            models.Index(fields=["title", "id"], name="product_title_id_idx"),
+            # incremental "changed since" feed exports
+            models.Index(fields=["last_update"], name="product_last_update_idx"),
+            GinIndex(fields=["search_vector"], name="product_search_vector_gin"),
+            GinIndex(fields=["title"], opclasses=["gin_trgm_ops"], name="product_title_trgm_gin"),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class CatalogListing(models.Model):
+    # Narrow, denormalized copy of Product holding only what the catalog grid
+    # and its filters need (no description, brand name inlined, no join).
+    # Same id as the product. Kept in sync by store.listing / store.signals.
+    id = models.BigIntegerField(primary_key=True)
+    brand_id = models.BigIntegerField()
+    brand_name = models.CharField(max_length=100)
+
+    title = models.CharField(max_length=255)
+    gender = models.CharField(max_length=10, choices=Product.GENDER_CHOICES)
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    in_stock = models.BooleanField(default=True)
+    summary = models.CharField(max_length=80, blank=True)
+    image = models.ImageField(upload_to="products/", blank=True, null=True)
+
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["brand_id", "gender"], name="listing_brand_gender_idx"),
+            models.Index(fields=["unit_price", "id"], name="listing_price_id_idx"),
+            models.Index(fields=["title", "id"], name="listing_title_id_idx"),
+            GinIndex(fields=["search_vector"], name="listing_search_vector_gin"),
+            GinIndex(fields=["title"], opclasses=["gin_trgm_ops"], name="listing_title_trgm_gin"),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -94,6 +146,34 @@ class OrderItem(models.Model):
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
 
 
+class ProductDailySales(models.Model):
+    # Rollup of OrderItem per day, kept up to date by place_order
+    # (see store/rollups.py) so reports never scan the order lines
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_sales")
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "product"], name="unique_product_day_sales")
+        ]
+
+
+class BrandDailySales(models.Model):
+    day = models.DateField()
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name="daily_sales")
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "brand"], name="unique_brand_day_sales")
+        ]
+
+
 class Cart(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -126,25 +206,46 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart({self.user})"
 
-    @property
-    def total_items(self):
-        total = 0
+    def get_items(self):
+        # an unsaved cart (see peek_cart) has no rows, and asking the
+        # related manager would raise
+        if self.pk is None:
+            return CartItem.objects.none()
+        return self.items.all()
 
-        for item in self.items.all():
-            total = total + item.quantity
+    @cached_property
+    def totals(self):
+        # one aggregate query, reused by total_items and subtotal
+        return self.get_items().totals()
 
-        return total
+    @property
+    def total_items(self):
+        return self.totals["total_items"]
 
     @property
     def subtotal(self):
-        total = 0
+        return self.totals["subtotal"]
+
+
+class CartItemQuerySet(models.QuerySet):
+    TOTALS = {
+        "total_items": Sum("quantity"),
+        "subtotal": Sum(F("quantity") * F("product__unit_price")),
+    }
+
+    @staticmethod
+    def _clean_totals(totals):
+        return {
+            "total_items": totals["total_items"] or 0,
+            "subtotal": totals["subtotal"] or Decimal("0.00"),
+        }
+
+    def totals(self):
+        return self._clean_totals(self.aggregate(**self.TOTALS))
 
-        for item in self.items.select_related("product"):
-            price = item.product.unit_price
-            quantity = item.quantity
-            total = total + (price * quantity)
+    async def atotals(self):
+        return self._clean_totals(await self.aaggregate(**self.TOTALS))
 
-        return total
 
 class CartItem(models.Model):
     cart = models.ForeignKey(
@@ -155,6 +256,8 @@ class CartItem(models.Model):
     product = models.ForeignKey("Product", on_delete=models.PROTECT)
     quantity = models.PositiveSmallIntegerField(default=1)
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["cart", "product"], name="unique_cart_product")
@@ -195,3 +298,19 @@ class ShippingAddress(models.Model):
 
     def __str__(self):
         return f"ShippingAddress({self.user}) for Cart({self.cart_id})"
+
+
+class ArchivedCart(models.Model):
+    # What `prune_carts --archive` keeps of a deleted cart. Plain ids, no
+    # foreign keys, so the archive never blocks deleting users or products.
+    cart_id = models.BigIntegerField(unique=True)
+    user_id = models.BigIntegerField(db_index=True)
+    status = models.CharField(max_length=10)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    items = models.JSONField(default=list)  # [[product_id, quantity], ...]
+    shipping_address = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"ArchivedCart({self.cart_id})"
@@ -0,0 +1,183 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    next_cursor: str | None
+    previous_cursor: str | None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps({"d": direction, "k": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    # Bad / tampered cursors just mean "first page"
+    if not cursor:
+        return "next", None
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload["d"]
+        values = payload["k"]
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        return "next", None
+
+    if direction not in ("next", "prev") or not isinstance(values, list) or len(values) != size:
+        return "next", None
+
+    return direction, values
+
+
+def _split(field):
+    if field.startswith("-"):
+        return field[1:], True
+    return field, False
+
+
+def _reverse(ordering):
+    reversed_ordering = []
+    for field in ordering:
+        name, desc = _split(field)
+        reversed_ordering.append(name if desc else f"-{name}")
+    return reversed_ordering
+
+
+def _ordering_field(queryset, name):
+    # annotations (e.g. search rank) first, then model fields
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    return queryset.model._meta.get_field(name)
+
+
+def _coerce(queryset, ordering, values):
+    # Cursor values come back as JSON (strings for decimals, anything at all
+    # if tampered with); parse each with its field so the WHERE compares
+    # like with like. None means "can't use it, start from page 1".
+    coerced = []
+    for field, value in zip(ordering, values):
+        name, _ = _split(field)
+        try:
+            value = _ordering_field(queryset, name).to_python(value)
+        except (ValidationError, ValueError, TypeError, FieldDoesNotExist):
+            return None
+        if value is None:
+            return None
+        coerced.append(value)
+    return coerced
+
+
+def _keyset_filter(ordering, values, forward):
+    # (a, b) after (x, y)  ==>  a > x OR (a = x AND b > y)
+    # the last field must be unique (id) so the order is total
+    condition = None
+
+    for field, value in reversed(list(zip(ordering, values))):
+        name, desc = _split(field)
+        op = "lt" if desc == forward else "gt"
+        step = Q(**{f"{name}__{op}": value})
+
+        if condition is None:
+            condition = step
+        else:
+            condition = step | (Q(**{name: value}) & condition)
+
+    return condition
+
+
+def _row_key(row, ordering):
+    values = []
+    for field in ordering:
+        name, _ = _split(field)
+        value = getattr(row, name)
+        if isinstance(value, Decimal):
+            value = str(value)
+        values.append(value)
+    return values
+
+
+def _page_query(queryset, ordering, cursor, per_page):
+    direction, values = decode_cursor(cursor, len(ordering))
+    if values is not None:
+        values = _coerce(queryset, ordering, values)
+        if values is None:
+            direction = "next"
+    forward = direction == "next"
+
+    qs = queryset
+    if values is not None:
+        qs = qs.filter(_keyset_filter(ordering, values, forward))
+
+    if forward:
+        qs = qs.order_by(*ordering)
+    else:
+        qs = qs.order_by(*_reverse(ordering))
+
+    # one extra row tells us if there is another page
+    return qs[:per_page + 1], forward, values is not None
+
+
+def _build_page(rows, ordering, per_page, forward, from_cursor):
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if forward:
+        has_next = has_more
+        has_previous = from_cursor
+    else:
+        rows.reverse()
+        has_next = True
+        has_previous = has_more
+
+    next_cursor = None
+    previous_cursor = None
+
+    if rows and has_next:
+        next_cursor = encode_cursor("next", _row_key(rows[-1], ordering))
+    if rows and has_previous:
+        previous_cursor = encode_cursor("prev", _row_key(rows[0], ordering))
+
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def keyset_paginate(queryset, ordering, cursor=None, per_page=24):
+    """
+    Seek-method pagination: WHERE (sort keys) > (last seen keys) LIMIT n+1.
+    Cost stays the same on page 1 and page 1000, and there is no COUNT(*).
+    """
+    qs, forward, from_cursor = _page_query(queryset, ordering, cursor, per_page)
+    return _build_page(list(qs), ordering, per_page, forward, from_cursor)
+
+
+async def akeyset_paginate(queryset, ordering, cursor=None, per_page=24):
+    qs, forward, from_cursor = _page_query(queryset, ordering, cursor, per_page)
+    rows = [row async for row in qs]
+    return _build_page(rows, ordering, per_page, forward, from_cursor)
@@ -0,0 +1,86 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .cart_utils import cart_summary_key
+from .models import ArchivedCart, Cart, CartItem, ShippingAddress
+
+CART_FIELDS = ("id", "user_id", "status", "created_at", "updated_at")
+
+
+def _delete_in(model, column, ids):
+    # A plain DELETE .. = ANY(ids). QuerySet.delete() would SELECT every
+    # item first and fire cart_item_changed per row, which looks the cart
+    # up again each time.
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {qn(model._meta.db_table)} WHERE {qn(column)} = ANY(%s)", [ids])
+        return cursor.rowcount
+
+
+def _archive(carts):
+    ids = [cart["id"] for cart in carts]
+    items = defaultdict(list)
+    for cart_id, product_id, quantity in (
+        CartItem.objects.filter(cart_id__in=ids).order_by("cart_id", "product_id")
+        .values_list("cart_id", "product_id", "quantity")
+    ):
+        items[cart_id].append([product_id, quantity])
+    addresses = {address["cart_id"]: address for address in ShippingAddress.objects.filter(cart_id__in=ids).values()}
+
+    # ignore_conflicts: a batch retried after a failure may have been archived already
+    return len(ArchivedCart.objects.bulk_create([
+        ArchivedCart(
+            cart_id=cart["id"],
+            user_id=cart["user_id"],
+            status=cart["status"],
+            created_at=cart["created_at"],
+            updated_at=cart["updated_at"],
+            items=items[cart["id"]],
+            shipping_address=addresses.get(cart["id"]),
+        )
+        for cart in carts
+    ], ignore_conflicts=True))
+
+
+def prune_cart_batch(status, cutoff, after_id=0, batch_size=500, archive=False, lock_timeout=2.0):
+    """
+    Delete (or archive, then delete) up to `batch_size` carts with `status`
+    untouched since `cutoff` and an id above `after_id`, in one short
+    transaction. Carts a live request has locked are skipped, not waited
+    for; anything else that would wait longer than `lock_timeout` seconds
+    raises OperationalError and rolls the batch back.
+
+    Returns None when there is nothing left, else the counts and the last
+    cart id (the next batch's `after_id`).
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('lock_timeout', %s, true)", [f"{int(lock_timeout * 1000)}ms"])
+
+        carts = list(
+            Cart.objects.select_for_update(skip_locked=True)
+            .filter(status=status, updated_at__lt=cutoff, id__gt=after_id)
+            .order_by("id")
+            .values(*CART_FIELDS)[:batch_size]
+        )
+        if not carts:
+            return None
+
+        ids = [cart["id"] for cart in carts]
+        archived = _archive(carts) if archive else 0
+        result = {
+            "last_id": ids[-1],
+            "archived": archived,
+            "items": _delete_in(CartItem, "cart_id", ids),
+            "addresses": _delete_in(ShippingAddress, "cart_id", ids),
+            "carts": _delete_in(Cart, "id", ids),
+        }
+
+        if status == Cart.Status.OPENED:
+            # the raw DELETEs skipped the signals, drop the badge counts here
+            keys = [cart_summary_key(cart["user_id"]) for cart in carts]
+            transaction.on_commit(lambda: cache.delete_many(keys))
+
+    return result
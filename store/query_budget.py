@@ -0,0 +1,155 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Max queries per request, keyed by URL name. Measured with a cold cache
+# and a logged in shopper, so it is the worst case. Override/extend with
+# settings.QUERY_BUDGETS.
+DEFAULT_BUDGETS = {
+    "home": {"queries": 9, "duplicates": 0},
+    "product-detail": {"queries": 7, "duplicates": 0},
+    "cart-detail": {"queries": 4, "duplicates": 0},
+    "checkout-review": {"queries": 5, "duplicates": 0},
+    "place-order": {"queries": 16, "duplicates": 0},
+}
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# transaction bookkeeping, not work the view asked for
+_savepoints = re.compile(r"^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b", re.I)
+
+
+def get_budget(url_name):
+    budgets = {**DEFAULT_BUDGETS, **getattr(settings, "QUERY_BUDGETS", {})}
+    return budgets.get(url_name)
+
+
+def normalize_sql(sql):
+    # same statement shape with different parameters counts as a duplicate (N+1)
+    return _literals.sub("?", sql)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if _savepoints.match(sql):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def db_ms(self):
+        return round(sum(duration for _, duration in self.queries) * 1000, 2)
+
+    def duplicates(self):
+        counts = Counter(normalize_sql(sql) for sql, _ in self.queries)
+        return {sql: n for sql, n in counts.items() if n > 1}
+
+    def over_budget(self, budget):
+        # list of human readable problems, empty when within budget
+        problems = []
+        if budget is None:
+            return problems
+
+        if "queries" in budget and self.count > budget["queries"]:
+            problems.append(f"{self.count} queries (budget {budget['queries']})")
+
+        duplicates = self.duplicates()
+        if "duplicates" in budget and len(duplicates) > budget["duplicates"]:
+            problems.append(f"{len(duplicates)} repeated statements (budget {budget['duplicates']})")
+
+        if "db_ms" in budget and self.db_ms > budget["db_ms"]:
+            problems.append(f"{self.db_ms}ms in the database (budget {budget['db_ms']}ms)")
+
+        return problems
+
+    def report(self):
+        lines = [f"{self.count} queries, {self.db_ms}ms"]
+        for sql, n in self.duplicates().items():
+            lines.append(f"  x{n}: {sql[:200]}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def record_queries(using=None):
+    # every configured database by default, replicas count too
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for alias in [using] if using else connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts queries, repeated statements and DB time per request and logs a
+    warning when a view goes over its budget. With DEBUG on the numbers are
+    also sent as a Server-Timing header (visible in the browser dev tools).
+    Only installed with DEBUG or QUERY_BUDGETS_ENABLED on.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        # off in production: it wraps every query and adds two thread hops
+        # per async request. DEBUG or QUERY_BUDGETS_ENABLED turns it on.
+        if not (settings.DEBUG or getattr(settings, "QUERY_BUDGETS_ENABLED", False)):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        return self.check(request, response, recorder)
+
+    async def __acall__(self, request):
+        # The async ORM runs its queries on a worker thread that has its own
+        # connection objects, so the recorder has to be attached over there
+        stack = ExitStack()
+        recorder = await sync_to_async(stack.enter_context)(record_queries())
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.check(request, response, recorder)
+
+    def check(self, request, response, recorder):
+        match = getattr(request, "resolver_match", None)
+        url_name = match.url_name if match else None
+        problems = recorder.over_budget(get_budget(url_name))
+
+        if problems:
+            logger.warning(
+                "%s over query budget: %s\n%s", url_name, "; ".join(problems), recorder.report()
+            )
+
+        if settings.DEBUG:
+            response["Server-Timing"] = (
+                f'db;dur={recorder.db_ms};desc="{recorder.count} queries, '
+                f'{len(recorder.duplicates())} repeated"'
+            )
+
+        return response
@@ -0,0 +1,122 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import BrandDailySales, OrderItem, ProductDailySales
+
+
+def _upsert(model, key, rows):
+    # INSERT .. ON CONFLICT DO UPDATE that *adds* to the counters, which
+    # bulk_create(update_conflicts=True) can't do (it overwrites)
+    if not rows:
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    key = qn(key)
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+
+    sql = (
+        f"INSERT INTO {table} (day, {key}, units, revenue, orders) VALUES {placeholders} "
+        f"ON CONFLICT (day, {key}) DO UPDATE SET "
+        f"units = {table}.units + EXCLUDED.units, "
+        f"revenue = {table}.revenue + EXCLUDED.revenue, "
+        f"orders = {table}.orders + EXCLUDED.orders"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for row in rows for value in row])
+
+
+def record_order_sales(order, lines):
+    """
+    Add one order to the daily rollups. `lines` are (product, quantity,
+    unit_price) tuples. Two statements whatever the size of the order; rows
+    go in key order so concurrent checkouts lock them in the same order.
+    """
+    day = timezone.localdate(order.placed_at)
+    products = defaultdict(lambda: [0, Decimal("0.00")])
+    brands = defaultdict(lambda: [0, Decimal("0.00")])
+
+    for product, quantity, unit_price in lines:
+        for totals in (products[product.id], brands[product.brand_id]):
+            totals[0] += quantity
+            totals[1] += quantity * unit_price
+
+    _upsert(ProductDailySales, "product_id", [
+        (day, product_id, units, revenue, 1) for product_id, (units, revenue) in sorted(products.items())
+    ])
+    _upsert(BrandDailySales, "brand_id", [
+        (day, brand_id, units, revenue, 1) for brand_id, (units, revenue) in sorted(brands.items())
+    ])
+
+
+def _daily_totals(items, key):
+    return (
+        items.annotate(day=TruncDate("order__placed_at"))
+        .values("day", key)
+        .annotate(
+            units=Sum("quantity"),
+            revenue=Sum(F("quantity") * F("unit_price")),
+            orders=Count("order_id", distinct=True),
+        )
+        .order_by()
+    )
+
+
+@transaction.atomic
+def rebuild_sales_rollups(since=None, batch_size=2000):
+    """
+    Regenerate the rollups from the order lines, everything or from the
+    date `since` onwards. Returns (product rows, brand rows).
+    """
+    items = OrderItem.objects.all()
+    product_rollups = ProductDailySales.objects.all()
+    brand_rollups = BrandDailySales.objects.all()
+
+    if since is not None:
+        items = items.filter(order__placed_at__date__gte=since)
+        product_rollups = product_rollups.filter(day__gte=since)
+        brand_rollups = brand_rollups.filter(day__gte=since)
+
+    product_rollups.delete()
+    brand_rollups.delete()
+
+    counts = []
+    for model, key, field in (
+        (ProductDailySales, "product_id", "product_id"),
+        (BrandDailySales, "product__brand_id", "brand_id"),
+    ):
+        # rollups are small (days x products), fine to build in memory
+        created = model.objects.bulk_create([
+            model(day=row["day"], units=row["units"], revenue=row["revenue"], orders=row["orders"], **{field: row[key]})
+            for row in _daily_totals(items, key)
+        ], batch_size=batch_size)
+        counts.append(len(created))
+
+    return tuple(counts)
+
+
+def sales_report(since, limit=20):
+    # reads the rollup rows only, never OrderItem
+    brand_rows = BrandDailySales.objects.filter(day__gte=since)
+    product_rows = ProductDailySales.objects.filter(day__gte=since)
+    totals = {"units": Sum("units"), "revenue": Sum("revenue")}
+
+    return {
+        "totals": brand_rows.aggregate(**totals),
+        "days": brand_rows.values("day").annotate(**totals).order_by("-day"),
+        "brands": (
+            brand_rows.values("brand_id", "brand__name")
+            .annotate(**totals, orders=Sum("orders"))
+            .order_by("-revenue")[:limit]
+        ),
+        "products": (
+            product_rows.values("product_id", "product__title")
+            .annotate(**totals, orders=Sum("orders"))
+            .order_by("-revenue")[:limit]
+        ),
+    }
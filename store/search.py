@@ -0,0 +1,57 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = "english"
+
+# Fields that feed Product.search_vector, used to skip needless refreshes
+SEARCH_FIELDS = {
+    "title", "brand", "description", "dial_color", "strap_color", "strap_material",
+}
+
+
+def product_search_vector(brand_name):
+    # brand lives in another table, so its name is passed in as a value
+    # (UPDATE ... SET can't join)
+    return (
+        SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(Value(brand_name), weight="B", config=SEARCH_CONFIG)
+        + SearchVector("dial_color", "strap_color", "strap_material", weight="C", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="D", config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vector(queryset, brand_name, **extra):
+    # all rows in queryset must belong to the brand called brand_name
+    return queryset.update(search_vector=product_search_vector(brand_name), **extra)
+
+
+def refresh_search_vectors(queryset):
+    # one UPDATE per brand present in queryset
+    from .models import Brand
+
+    brands = Brand.objects.filter(product__in=queryset.values("pk")).distinct()
+    for brand in brands:
+        update_search_vector(queryset.filter(brand=brand), brand.name)
+
+
+def search_products(queryset, q):
+    """
+    Full-text match on the search vector, OR a trigram match on the title
+    for typos. Both sides are GIN indexed, so Postgres can BitmapOr them.
+    Adds a `rank` annotation for relevance ordering.
+    """
+    query = SearchQuery(q, search_type="websearch", config=SEARCH_CONFIG)
+
+    # both functions return float4; as double precision the rank a keyset
+    # cursor carries is exactly the one the next page compares against
+    return queryset.annotate(
+        rank=Cast(SearchRank(F("search_vector"), query) + TrigramSimilarity("title", q), FloatField()),
+    ).filter(
+        Q(search_vector=query) | Q(title__trigram_similar=q)
+    )
@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .auth_cache import invalidate_cached_user
+from .cart_utils import invalidate_cart_summary, merge_guest_cart
+from .catalog_cache import bump_catalog_version, invalidate_product_versions
+from .images import derivative_exists, schedule_derivatives
+from .listing import sync_listings
+from tags.models import Tag, TaggedItem
+
+from .models import Brand, Cart, CartItem, CatalogListing, Customer, Product
+from .search import SEARCH_FIELDS, update_search_vector
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCH_FIELDS & set(update_fields):
+        update_search_vector(Product.objects.filter(pk=instance.pk), instance.brand.name)
+
+    # after the search vector, the listing copies it
+    sync_listings([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    CatalogListing.objects.filter(pk=instance.pk).delete()
+
+
+@receiver(post_save, sender=Product)
+def product_image_saved(sender, instance, update_fields=None, **kwargs):
+    if not instance.image or (update_fields is not None and "image" not in update_fields):
+        return
+
+    name = instance.image.name
+    if not derivative_exists(name, "zoom"):
+        # resizing happens in the worker pool, not in this request
+        transaction.on_commit(lambda: schedule_derivatives(name))
+
+
+@receiver(post_save, sender=Brand)
+def brand_saved(sender, instance, created, **kwargs):
+    if not created:
+        # touching last_update also moves the products' ETags / page caches
+        products = Product.objects.filter(brand=instance)
+        update_search_vector(products, instance.name, last_update=timezone.now())
+
+        product_ids = list(products.values_list("pk", flat=True))
+        invalidate_product_versions(product_ids)
+        sync_listings(product_ids)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_version_changed(sender, instance, **kwargs):
+    invalidate_product_versions([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=TaggedItem)
+@receiver(post_delete, sender=TaggedItem)
+def catalog_changed(sender, **kwargs):
+    # after commit, so nobody re-caches the old rows in between
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    invalidate_cart_summary(instance.user_id)
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_item_changed(sender, instance, **kwargs):
+    if CartItem.cart.is_cached(instance):
+        user_id = instance.cart.user_id
+    else:
+        user_id = Cart.objects.filter(pk=instance.cart_id).values_list("user_id", flat=True).first()
+
+    if user_id is not None:
+        invalidate_cart_summary(user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    # password, is_active, names... the cached request.user has to go
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def customer_changed(sender, instance, **kwargs):
+    if instance.user_id is not None:
+        invalidate_cached_user(instance.user_id)
+
+
+@receiver(user_logged_in)
+def guest_cart_logged_in(sender, request, user, **kwargs):
+    # allauth logs in through django.contrib.auth too, so this covers both
+    guest_cart = getattr(request, "guest_cart", None)
+    if guest_cart:
+        merge_guest_cart(user, guest_cart.quantities)
+        guest_cart.clear()
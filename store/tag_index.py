@@ -0,0 +1,48 @@
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from tags.utils import build_tag_index, match_tag_index
+
+from .catalog_cache import acatalog_version, catalog_version
+from .models import Product
+
+# (catalog version, {label: frozenset(product ids)}), one copy per process.
+# Tag and product changes bump the catalog version, so a stale copy is
+# rebuilt on the next lookup. Swapped as one tuple so readers never see a
+# new version with the old sets.
+_index = (None, {})
+_lock = threading.Lock()
+
+
+def tag_index_enabled():
+    return getattr(settings, "STORE_TAG_INDEX", False)
+
+
+def _rebuild(version):
+    global _index
+    with _lock:
+        if _index[0] != version:
+            _index = (version, build_tag_index(Product))
+        return _index[1]
+
+
+def get_tag_index():
+    version = catalog_version()
+    current_version, tags = _index
+    return tags if current_version == version else _rebuild(version)
+
+
+async def aget_tag_index():
+    version = await acatalog_version()
+    current_version, tags = _index
+    return tags if current_version == version else await sync_to_async(_rebuild)(version)
+
+
+def product_ids_for_tags(labels, match_all=True):
+    return match_tag_index(get_tag_index(), labels, match_all)
+
+
+async def aproduct_ids_for_tags(labels, match_all=True):
+    return match_tag_index(await aget_tag_index(), labels, match_all)
@@ -0,0 +1,24 @@
+from django import template
+
+from store.images import IMAGE_SIZES, derivative_exists, derivative_name
+from django.core.files.storage import default_storage
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_variant(image, size):
+    # URL of one derivative, falling back to the original until it's generated
+    if derivative_exists(image.name, size):
+        return default_storage.url(derivative_name(image.name, size))
+    return image.url
+
+
+@register.simple_tag
+def image_srcset(image):
+    candidates = [
+        f"{default_storage.url(derivative_name(image.name, size))} {width}w"
+        for size, width in IMAGE_SIZES.items()
+        if derivative_exists(image.name, size)
+    ]
+    return ", ".join(candidates)
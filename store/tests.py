@@ -1,3 +1,1557 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse, QueryDict
+from django.db import router
+from django.template import Context, Template
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from tags.models import Tag, TaggedItem
+
+from .auth_cache import user_cache_key
+from .context_processors import cart_item_count
+from .cart_utils import MAX_LINE_QUANTITY, add_to_cart, get_cart_summary, get_or_create_cart
+from .catalog_cache import (
+    CATALOG_TIMEOUT, CATALOG_VERSION_KEY, aget_or_set_catalog, bump_catalog_version, catalog_version, fill_timeout,
+    get_or_set_catalog,
+)
+from .db_routing import STICKY_COOKIE, ReplicaRoutingMiddleware, replica_reads
+from .listing import sync_listings
+from .management.commands.bench_checkout import Command as BenchCheckout
+from .facets import PRICE_BUCKETS, compute_facets
+from .feeds import FEED_FIELDS, aiter_chunks
+from .filters import apply_filters, parse_filters
+from .images import IMAGE_SIZES, derivative_exists, derivative_name, generate_derivatives, record_derivatives
+from .guest_cart import COOKIE_NAME, GuestCartMiddleware
+from .pagination import encode_cursor, keyset_paginate
+from .models import (
+    ArchivedCart, Brand, BrandDailySales, Cart, CartItem, CatalogListing, Customer, Order, OrderItem, Product,
+    ProductDailySales, ShippingAddress,
+)
+from .query_budget import QueryBudgetMiddleware, get_budget, record_queries
+from .rollups import rebuild_sales_rollups
+from .tag_index import product_ids_for_tags
+from .views import catalog_feed
+from .search import refresh_search_vectors, search_products
+
+
+def seed_catalog(brands=4, per_brand=30):
+    # bulk inserts skip the post_save signals, so build the search vectors
+    # and the listing rows once at the end like the import command does
+    brand_objs = Brand.objects.bulk_create([Brand(name=f"Brand {i}") for i in range(brands)])
+    genders = ["men", "women", "unisex"]
+
+    Product.objects.bulk_create([
+        Product(
+            brand=brand,
+            title=f"{brand.name} watch {i}",
+            gender=genders[i % len(genders)],
+            dial_color="black",
+            strap_color="brown",
+            strap_material="leather" if i % 2 else "steel",
+            size=38 + i % 6,
+            description="Sapphire crystal, automatic movement, 100m water resistance. " * 3,
+            unit_price=Decimal(40 + i * 7),
+            inventory=20,
+        )
+        for brand in brand_objs
+        for i in range(per_brand)
+    ])
+
+    products = Product.objects.all()
+    refresh_search_vectors(products)
+    sync_listings(products.values_list("id", flat=True))
+    return list(products.order_by("id"))
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Fails when a page goes over the query budget declared in
+    store/query_budget.py. Every request runs against a cold cache.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog()
+        cls.user = get_user_model().objects.create_user("shopper", "shopper@example.com", "pass")
+
+        cls.cart = Cart.objects.create(user=cls.user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cls.cart, product=product, quantity=2) for product in cls.products[:8]
+        ])
+        ShippingAddress.objects.create(
+            user=cls.user, cart=cls.cart, full_name="Shopper", phone="0790000000", city="Amman", street="Main"
+        )
+
+    def setUp(self):
+        cache.clear()
+        # ContentType lookups are cached for the life of the process
+        ContentType.objects.get_for_model(Product)
+        self.client.force_login(self.user)
+
+    def request(self, url_name, method="get", **kwargs):
+        url = reverse(url_name, kwargs=kwargs)
+        with record_queries() as recorder:
+            response = getattr(self.client, method)(url)
+
+        problems = recorder.over_budget(get_budget(url_name))
+        if problems:
+            self.fail(f"{url_name} over budget: {'; '.join(problems)}\n{recorder.report()}")
+        return response, recorder
+
+    def assertNoRepeatedQueries(self, recorder):
+        self.assertEqual(recorder.duplicates(), {}, recorder.report())
+
+    def test_home(self):
+        response, recorder = self.request("home")
+        self.assertEqual(response.status_code, 200)
+        self.assertNoRepeatedQueries(recorder)
+
+    def test_home_filtered(self):
+        url = reverse("home") + "?gender=men&min_price=50.00&sort=price_asc"
+        with record_queries() as recorder:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(recorder.over_budget(get_budget("home")), [], recorder.report())
+
+    def test_product_detail(self):
+        response, recorder = self.request("product-detail", id=self.products[0].id)
+        self.assertEqual(response.status_code, 200)
+        self.assertNoRepeatedQueries(recorder)
+
+    def test_cart_detail(self):
+        response, recorder = self.request("cart-detail")
+        self.assertEqual(response.status_code, 200)
+        self.assertNoRepeatedQueries(recorder)
+
+    def test_checkout_review(self):
+        response, recorder = self.request("checkout-review")
+        self.assertEqual(response.status_code, 200)
+        self.assertNoRepeatedQueries(recorder)
+
+    def test_place_order(self):
+        response, recorder = self.request("place-order", method="post")
+        self.assertRedirects(response, reverse("checkout-success"), fetch_redirect_response=False)
+        self.assertNoRepeatedQueries(recorder)
+
+    def test_cart_queries_do_not_grow_with_lines(self):
+        _, small = self.request("cart-detail")
+
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=1) for product in self.products[8:40]
+        ])
+        cache.clear()
+        self.client.force_login(self.user)
+        _, large = self.request("cart-detail")
+
+        self.assertEqual(small.count, large.count, large.report())
+
+    def test_middleware_is_off_unless_enabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryBudgetMiddleware(lambda request: HttpResponse())
+        with self.assertNoLogs("store.query_budget"):
+            self.client.get(reverse("home"))
+
+    @override_settings(QUERY_BUDGETS_ENABLED=True, QUERY_BUDGETS={"home": {"queries": 0}})
+    def test_middleware_warns_when_enabled(self):
+        with self.assertLogs("store.query_budget", "WARNING") as logs:
+            response = self.client.get(reverse("home"))
+        self.assertIn("home over query budget", logs.output[0])
+        # Server-Timing is DEBUG only
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(DEBUG=True)
+    def test_middleware_in_an_async_stack(self):
+        async def view(request):
+            await Product.objects.acount()
+            await Product.objects.afirst()
+            return HttpResponse()
+
+        middleware = QueryBudgetMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        response = async_to_sync(middleware)(RequestFactory().get("/"))
+        self.assertIn('"2 queries', response["Server-Timing"])
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(brands=2, per_brand=5)
+        cls.staff = get_user_model().objects.create_user("staff", "staff@example.com", "pass", is_staff=True)
+
+    def checkout(self, username, lines):
+        user = get_user_model().objects.create_user(username, f"{username}@example.com", "pass")
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=qty) for product, qty in lines])
+        ShippingAddress.objects.create(user=user, cart=cart, full_name="A", phone="0", city="Amman", street="Main")
+
+        self.client.force_login(user)
+        self.client.post(reverse("place-order"))
+
+    def rollups(self):
+        return (
+            sorted(ProductDailySales.objects.values_list("day", "product_id", "units", "revenue", "orders")),
+            sorted(BrandDailySales.objects.values_list("day", "brand_id", "units", "revenue", "orders")),
+        )
+
+    def test_place_order_matches_rebuild(self):
+        first, second, other_brand = self.products[0], self.products[1], self.products[-1]
+        self.checkout("a", [(first, 2), (second, 1)])
+        self.checkout("b", [(first, 1), (other_brand, 3)])
+
+        incremental = self.rollups()
+        rebuild_sales_rollups()
+        self.assertEqual(incremental, self.rollups())
+
+        brand = BrandDailySales.objects.get(brand_id=first.brand_id)
+        self.assertEqual((brand.units, brand.orders), (4, 2))
+        self.assertEqual(brand.revenue, 3 * first.unit_price + second.unit_price)
+
+    def test_dashboard_is_staff_only(self):
+        self.checkout("a", [(self.products[0], 1)])
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("sales-dashboard"))
+        self.assertContains(response, self.products[0].title)
+
+        self.client.force_login(get_user_model().objects.get(username="a"))
+        self.assertEqual(self.client.get(reverse("sales-dashboard")).status_code, 302)
+
+
+class TagFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(brands=1, per_brand=6)
+        content_type = ContentType.objects.get_for_model(Product)
+        diver, chrono, gmt = Tag.objects.bulk_create([Tag(label="diver"), Tag(label="chronograph"), Tag(label="gmt")])
+
+        p = cls.products
+        TaggedItem.objects.bulk_create([
+            TaggedItem(tag=tag, content_type=content_type, object_id=product.id)
+            for tag, product in [
+                (diver, p[0]), (diver, p[1]), (diver, p[2]),
+                (chrono, p[1]), (chrono, p[2]), (chrono, p[3]),
+                (gmt, p[2]),
+            ]
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def matching(self, query):
+        filters = parse_filters(QueryDict(query))
+        return set(apply_filters(CatalogListing.objects.all(), filters).values_list("id", flat=True))
+
+    def ids(self, *indexes):
+        return {self.products[i].id for i in indexes}
+
+    def test_all_and_any(self):
+        self.assertEqual(self.matching("tag=diver"), self.ids(0, 1, 2))
+        self.assertEqual(self.matching("tag=diver&tag=chronograph"), self.ids(1, 2))
+        self.assertEqual(self.matching("tag=diver&tag=chronograph&tag=gmt"), self.ids(2))
+        self.assertEqual(self.matching("tag=diver&tag=chronograph&tag_mode=any"), self.ids(0, 1, 2, 3))
+        self.assertEqual(self.matching("tag=nope"), set())
+
+    def test_index_matches_database(self):
+        product_ids_for_tags(["diver"])  # build the index
+
+        for labels in (["diver", "chronograph"], ["chronograph", "gmt"], ["gmt", "nope"]):
+            for match_all in (True, False):
+                with self.assertNumQueries(0):
+                    ids = product_ids_for_tags(labels, match_all)
+
+                query = "&".join(f"tag={label}" for label in labels) + ("" if match_all else "&tag_mode=any")
+                self.assertEqual(set(ids), self.matching(query))
+
+    @override_settings(STORE_TAG_INDEX=True)
+    def test_home_with_index(self):
+        product_ids_for_tags(["diver"])  # build the index
+        response = self.client.get(reverse("home") + "?tag=chronograph&tag=diver")
+
+        self.assertEqual({p.id for p in response.context["products"]}, self.ids(1, 2))
+        self.assertContains(response, "match any tag")
+
+    def test_home_prefetches_tags(self):
+        ContentType.objects.get_for_model(Product)
+        with record_queries() as recorder:
+            response = self.client.get(reverse("home"))
+
+        tags = {p.id: p.tag_list for p in response.context["products"]}
+        self.assertEqual(tags[self.products[2].id], ["chronograph", "diver", "gmt"])
+        self.assertEqual(tags[self.products[4].id], [])
+        self.assertEqual(recorder.duplicates(), {}, recorder.report())
+
+
+class FacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # prices 40..243, so the first two price buckets have rows
+        cls.products = seed_catalog(brands=3, per_brand=30)
+        cls.brand_ids = sorted({p.brand_id for p in cls.products})
+
+    def count(self, filters, **override):
+        return apply_filters(CatalogListing.objects.all(), dict(filters, **override)).count()
+
+    def expected(self, filters):
+        # one COUNT per facet value, each ignoring its own facet's selection
+        brands = {brand_id: self.count(filters, brand=[brand_id]) for brand_id in self.brand_ids}
+        return {
+            "brand": {brand_id: n for brand_id, n in brands.items() if n},
+            "gender": {gender: self.count(filters, gender=[gender]) for gender in ("men", "women", "unisex")},
+            "price": [
+                self.count(
+                    filters, min_price=low,
+                    max_price=None if high is None else high - Decimal("0.01"),
+                )
+                for _, low, high in PRICE_BUCKETS
+            ],
+        }
+
+    def test_counts_match_a_count_per_value(self):
+        b0, b1, _ = self.brand_ids
+        for query in (
+            "",
+            f"brand={b0}",
+            f"brand={b0}&brand={b1}&gender=women",
+            "gender=men&gender=unisex&min_price=90",
+            f"brand={b1}&max_price=150&q=watch",
+        ):
+            with self.subTest(query=query):
+                filters = parse_filters(QueryDict(query))
+                with self.assertNumQueries(1):
+                    facets = compute_facets(CatalogListing.objects.all(), filters)
+
+                expected = self.expected(filters)
+                self.assertEqual(facets["brand"], expected["brand"])
+                self.assertEqual({g: facets["gender"][g] for g in expected["gender"]}, expected["gender"])
+                self.assertEqual([bucket["count"] for bucket in facets["price"]], expected["price"])
+
+    def test_selection_does_not_hide_its_siblings(self):
+        b0, b1, b2 = self.brand_ids
+        facets = compute_facets(CatalogListing.objects.all(), parse_filters(QueryDict(f"brand={b0}&gender=men")))
+
+        self.assertEqual(facets["brand"], {b0: 10, b1: 10, b2: 10})
+        self.assertEqual((facets["gender"]["men"], facets["gender"]["women"]), (10, 10))
+
+
+class CanonicalUrlTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(brands=2, per_brand=3)
+        cls.b0, cls.b1 = sorted({p.brand_id for p in cls.products})
+
+    def setUp(self):
+        cache.clear()
+
+    def assertRedirectsTo(self, query, canonical):
+        home = reverse("home")
+        response = self.client.get(f"{home}?{query}")
+        expected = f"{home}?{canonical}" if canonical else home
+        self.assertRedirects(response, expected, fetch_redirect_response=False)
+        self.assertEqual(self.client.get(expected).status_code, 200)
+
+    def test_same_filters_one_url(self):
+        canonical = f"brand={self.b0}&brand={self.b1}&gender=men&min_price=50.00"
+        for query in (
+            f"brand={self.b1}&brand={self.b0}&gender=men&min_price=50",
+            f"gender=men&gender=men&min_price=50.0&brand={self.b0}&brand={self.b1}&q=",
+            f"min_price=50&brand={self.b0}&brand={self.b1}&brand={self.b1}&gender=men&gender=robot",
+        ):
+            with self.subTest(query=query):
+                self.assertRedirectsTo(query, canonical)
+
+    def test_defaults_and_junk_are_dropped(self):
+        self.assertRedirectsTo("sort=newest", "")
+        self.assertRedirectsTo("q=&brand=&max_price=abc&utm_source=mail", "")
+        self.assertRedirectsTo("q=++steel++watch&sort=relevance", "q=steel+watch")
+        self.assertRedirectsTo("sort=bogus&gender=women", "gender=women")
+
+    def test_unusable_prices_and_brands_are_dropped(self):
+        for query in (
+            "min_price=NaN", "max_price=-Infinity", "min_price=sNaN", "max_price=1e999999",
+            "brand=%C2%B2", "brand=%D9%A3", "brand=-1",
+        ):
+            with self.subTest(query=query):
+                filters = parse_filters(QueryDict(query))
+                self.assertEqual((filters["brand"], filters["min_price"], filters["max_price"]), ([], None, None))
+                self.assertRedirectsTo(query, "")
+
+        self.assertRedirectsTo(f"brand=%C2%B2&brand={self.b0}&max_price=1e3", f"brand={self.b0}&max_price=1000.00")
+        self.assertEqual(self.client.get(reverse("home"), {"max_price": "99999999.00"}).status_code, 200)
+
+    def test_canonical_url_is_served(self):
+        for query in ("", "sort=price_asc", f"brand={self.b0}&gender=men&sort=title", "q=watch&sort=newest"):
+            with self.subTest(query=query):
+                url = f"{reverse('home')}?{query}" if query else reverse("home")
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class ProductConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = seed_catalog(brands=1, per_brand=2)[0]
+        cls.user = get_user_model().objects.create_user("shopper", "shopper@example.com", "pass")
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("product-detail", args=[self.product.id])
+
+    def get(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def test_matching_etag_is_a_304(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        with record_queries() as recorder:
+            response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        # the version comes from the cache, the product row isn't read
+        self.assertFalse(any('"store_product"."description"' in sql for sql, _ in recorder.queries), recorder.report())
+
+        self.assertEqual(self.get(if_none_match='"something-else"').status_code, 200)
+
+    def test_guests_also_get_last_modified(self):
+        response = self.get()
+        self.assertEqual(self.get(if_modified_since=response["Last-Modified"]).status_code, 304)
+
+    def test_etag_changes_with_the_product(self):
+        etag = self.get()["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=self.product.pk)
+            product.unit_price = Decimal("99.00")
+            product.save()
+
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_etag_changes_with_the_shopper(self):
+        self.client.force_login(self.user)
+        response = self.get()
+        etag = response["ETag"]
+        self.assertNotIn("Last-Modified", response)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("cart-add", args=[self.product.id]))
+        self.assertEqual(self.get(if_none_match=etag).status_code, 200)
+        etag = self.get()["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("product-like", args=[self.product.id]))
+        self.assertEqual(self.get(if_none_match=etag).status_code, 200)
+        self.assertEqual(self.get(if_none_match=self.get()["ETag"]).status_code, 304)
+
+
+class CacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(brands=1, per_brand=3)
+        cls.user = get_user_model().objects.create_user("shopper", "shopper@example.com", "pass")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_catalog_cache_hit_and_miss(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(get_or_set_catalog("test", {"brand": [1]}, compute), 1)
+        self.assertEqual(get_or_set_catalog("test", {"brand": [1]}, compute), 1)
+        # other filters, other entry
+        self.assertEqual(get_or_set_catalog("test", {"brand": [2]}, compute), 2)
+
+        bump_catalog_version()
+        self.assertEqual(get_or_set_catalog("test", {"brand": [1]}, compute), 3)
+
+        async def acompute():
+            calls.append(1)
+            return len(calls)
+
+        # the async path reads the same entries
+        self.assertEqual(async_to_sync(aget_or_set_catalog)("test", {"brand": [1]}, acompute), 3)
+        self.assertEqual(async_to_sync(aget_or_set_catalog)("test", {"brand": [3]}, acompute), 4)
+        self.assertEqual(len(calls), 4)
+
+    def test_catalog_pages_come_from_the_cache(self):
+        self.client.get(reverse("home"))
+        with record_queries() as recorder:
+            response = self.client.get(reverse("home"))
+        self.assertEqual(len(response.context["products"]), 3)
+        self.assertFalse(any("store_cataloglisting" in sql for sql, _ in recorder.queries), recorder.report())
+
+    def test_cart_badge_hit_miss_and_invalidation(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+
+        with self.assertNumQueries(1):
+            self.assertEqual(cart_item_count(request), {"cart_count": 0})
+        with self.assertNumQueries(0):
+            self.assertEqual(cart_item_count(request), {"cart_count": 0})
+
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("cart-add", args=[self.products[1].id]), {"quantity": 3})
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_cart_summary(self.user), {"count": 3, "subtotal": Decimal("141.00")})
+        with self.assertNumQueries(0):
+            self.assertEqual(cart_item_count(request), {"cart_count": 3})
+
+
+class ListingSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(brands=2, per_brand=3)
+
+    def setUp(self):
+        cache.clear()
+
+    def home(self, query=""):
+        return self.client.get(f"{reverse('home')}?{query}" if query else reverse("home"))
+
+    def test_product_save_reaches_the_listing_and_the_facets(self):
+        product = Product.objects.get(pk=self.products[0].pk)
+        self.assertEqual(self.home().context["price_facets"][0]["count"], 6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.title = "Limited edition"
+            product.unit_price = Decimal("300.00")
+            product.description = "x" * 100
+            product.save()
+
+        listing = CatalogListing.objects.get(pk=product.pk)
+        self.assertEqual((listing.title, listing.unit_price), ("Limited edition", Decimal("300.00")))
+        self.assertEqual(len(listing.summary), 60)
+
+        # the cached facets and page went with the catalog version
+        response = self.home()
+        self.assertEqual([bucket["count"] for bucket in response.context["price_facets"]][:3], [5, 0, 1])
+        self.assertIn(product.pk, [p.id for p in self.home("q=limited").context["products"]])
+
+    def test_brand_rename_and_product_delete(self):
+        brand = Brand.objects.get(pk=self.products[0].brand_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            brand.name = "Renamed"
+            brand.save()
+        self.assertEqual(
+            set(CatalogListing.objects.filter(brand_id=brand.pk).values_list("brand_name", flat=True)), {"Renamed"}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=self.products[1].pk).delete()
+        self.assertFalse(CatalogListing.objects.filter(pk=self.products[1].pk).exists())
+        counts = {b.pk: n for b, n in self.home().context["brand_facets"]}
+        self.assertEqual(counts[brand.pk], 2)
+
+
+class AsyncViewTests(TestCase):
+    # the async views through the ASGI handler, as uvicorn would run them
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(brands=2, per_brand=3)
+        cls.user = get_user_model().objects.create_user("shopper", "shopper@example.com", "pass")
+        cart = Cart.objects.create(user=cls.user)
+        CartItem.objects.create(cart=cart, product=cls.products[0], quantity=2)
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_home(self):
+        response = await self.async_client.get(reverse("home"), {"sort": "price_asc"})
+        self.assertEqual(response.status_code, 200)
+        prices = [p.unit_price for p in response.context["products"]]
+        self.assertEqual(prices, sorted(prices))
+        self.assertEqual(len(prices), 6)
+
+        # non-canonical URLs still redirect
+        response = await self.async_client.get(reverse("home"), {"sort": "newest"})
+        self.assertRedirects(response, reverse("home"), fetch_redirect_response=False)
+
+    async def test_product_detail(self):
+        product = self.products[0]
+        response = await self.async_client.get(reverse("product-detail", args=[product.id]))
+        self.assertContains(response, product.title)
+
+        response = await self.async_client.get(
+            reverse("product-detail", args=[product.id]), headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual((await self.async_client.get(reverse("product-detail", args=[999999]))).status_code, 404)
+
+    async def test_cart_for_a_shopper_and_a_guest(self):
+        response = await self.async_client.get(reverse("cart-detail"))
+        self.assertEqual(response.context["lines"], [])
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("cart-detail"))
+        self.assertEqual([(line["product"].pk, line["quantity"]) for line in response.context["lines"]],
+                         [(self.products[0].pk, 2)])
+        self.assertEqual(response.context["total"], Decimal("80.00"))
+        self.assertEqual(response.context["cart_count"], 2)
+
+
+class SeedStoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.real = seed_catalog(brands=1, per_brand=2)
+        cls.user = get_user_model().objects.create_user("real", "real@example.com", "pass")
+        cls.cart = Cart.objects.create(user=cls.user)
+        CartItem.objects.create(cart=cls.cart, product=cls.real[0], quantity=1)
+
+    def seed(self, *args):
+        call_command(
+            "seed_store", "--brands", "3", "--products", "40", "--users", "6", "--carts", "3", "--orders", "12",
+            *args, stdout=StringIO(),
+        )
+
+    def seeded(self):
+        return {
+            "products": sorted(Product.objects.filter(sku__startswith="SEED-").values_list("sku", "title", "unit_price")),
+            "users": get_user_model().objects.filter(username__startswith="seed-user-").count(),
+            "orders": Order.objects.filter(customer__user__username__startswith="seed-user-").count(),
+            "carts": Cart.objects.filter(user__username__startswith="seed-user-").count(),
+        }
+
+    def assertRealDataKept(self):
+        self.assertEqual(
+            set(Product.objects.exclude(sku__startswith="SEED-").values_list("pk", flat=True)),
+            {p.pk for p in self.real},
+        )
+        self.assertEqual(list(CartItem.objects.filter(cart=self.cart).values_list("product_id", flat=True)),
+                         [self.real[0].pk])
+        self.assertTrue(get_user_model().objects.filter(pk=self.user.pk).exists())
+
+    def test_clear_round_trip(self):
+        self.seed()
+        first = self.seeded()
+        self.assertEqual(len(first["products"]), 40)
+        self.assertEqual((first["users"], first["carts"], first["orders"]), (6, 3, 12))
+        self.assertEqual(CatalogListing.objects.count(), 42)
+
+        # --clear then the same seed: the same store again, nothing doubled
+        self.seed("--clear")
+        self.assertEqual(self.seeded(), first)
+        self.assertEqual(CatalogListing.objects.count(), 42)
+        self.assertRealDataKept()
+
+        call_command("seed_store", "--clear", "--brands", "0", "--products", "0", "--users", "0",
+                     "--carts", "0", "--orders", "0", stdout=StringIO())
+        self.assertEqual(self.seeded(), {"products": [], "users": 0, "orders": 0, "carts": 0})
+        self.assertEqual(CatalogListing.objects.count(), 2)
+        self.assertRealDataKept()
+
+
+class KeysetPaginationTests(TestCase):
+    ordering = ("unit_price", "id")
+
+    @classmethod
+    def setUpTestData(cls):
+        # 3 brands priced alike, so every price is shared by three rows
+        seed_catalog(brands=3, per_brand=5)
+
+    def setUp(self):
+        cache.clear()
+        self.listings = CatalogListing.objects.order_by(*self.ordering)
+
+    def ids(self, page):
+        return [row.id for row in page]
+
+    def test_next_and_prev_over_ties(self):
+        expected = list(self.listings.values_list("id", flat=True))
+        pages, cursor = [], None
+        while True:
+            page = keyset_paginate(self.listings, self.ordering, cursor=cursor, per_page=4)
+            pages.append(page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual([row_id for page in pages for row_id in self.ids(page)], expected)
+        self.assertFalse(pages[0].has_previous)
+
+        # the final page is short and has nowhere further to go
+        self.assertEqual(len(pages[-1]), 3)
+        self.assertIsNone(pages[-1].next_cursor)
+
+        # and walking back lands on the same pages
+        for earlier, later in zip(reversed(pages[:-1]), reversed(pages[1:])):
+            page = keyset_paginate(self.listings, self.ordering, cursor=later.previous_cursor, per_page=4)
+            self.assertEqual(self.ids(page), self.ids(earlier))
+
+    def test_relevance_pages(self):
+        # same title words per brand, so ranks tie in threes
+        ordering = ("-rank", "-id")
+        results = search_products(CatalogListing.objects.all(), "watch").order_by(*ordering)
+        expected = list(results.values_list("id", flat=True))
+        self.assertEqual(len(expected), 15)
+
+        seen, cursor = [], None
+        while True:
+            page = keyset_paginate(results, ordering, cursor=cursor, per_page=4)
+            seen += self.ids(page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(seen, expected)
+
+    def test_exact_fit_has_no_empty_last_page(self):
+        page = keyset_paginate(self.listings, self.ordering, per_page=15)
+        self.assertEqual(len(page), 15)
+        self.assertFalse(page.has_other_pages())
+
+    def test_tampered_cursor_is_the_first_page(self):
+        first = self.ids(keyset_paginate(self.listings, self.ordering, per_page=4))
+
+        for cursor in (
+            "not-a-cursor",
+            encode_cursor("next", ["abc", 1]),
+            encode_cursor("prev", ["40", "x"]),
+            encode_cursor("next", [None, 1]),
+            encode_cursor("next", [{"a": 1}, 1]),
+            encode_cursor("sideways", ["40", 1]),
+            encode_cursor("next", ["40"]),
+        ):
+            with self.subTest(cursor=cursor):
+                page = keyset_paginate(self.listings, self.ordering, cursor=cursor, per_page=4)
+                self.assertEqual(self.ids(page), first)
+                self.assertFalse(page.has_previous)
+
+        response = self.client.get(reverse("home"), {"sort": "price_asc", "cursor": encode_cursor("next", ["abc", 1])})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"], REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    # routing decisions only, no replica has to exist for these
+
+    def setUp(self):
+        # last catalog change long ago
+        cache.set(CATALOG_VERSION_KEY, 1, None)
+        self.factory = RequestFactory()
+
+    def route(self, request, write=False):
+        seen = {}
+
+        def view(request):
+            seen["before"] = Product.objects.all().db
+            if write:
+                router.db_for_write(Product)
+            seen["after"] = Product.objects.all().db
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen, response
+
+    def test_get_reads_from_replica(self):
+        seen, response = self.route(self.factory.get("/"))
+        self.assertEqual(seen, {"before": "replica1", "after": "replica1"})
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_post_stays_on_primary_and_sticks(self):
+        seen, response = self.route(self.factory.post("/"))
+        self.assertEqual(seen["before"], "default")
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        request = self.factory.get("/")
+        request.COOKIES[STICKY_COOKIE] = response.cookies[STICKY_COOKIE].value
+        seen, _ = self.route(request)
+        self.assertEqual(seen["before"], "default")
+
+    def test_expired_cookie_goes_back_to_replica(self):
+        request = self.factory.get("/")
+        request.COOKIES[STICKY_COOKIE] = "1.0"
+        seen, _ = self.route(request)
+        self.assertEqual(seen["before"], "replica1")
+
+    def test_write_during_get_moves_reads_to_primary(self):
+        seen, response = self.route(self.factory.get("/"), write=True)
+        self.assertEqual(seen, {"before": "replica1", "after": "default"})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_fills_right_after_a_change_expire_quickly(self):
+        self.assertEqual(fill_timeout(catalog_version()), CATALOG_TIMEOUT)
+        bump_catalog_version()
+        self.assertEqual(fill_timeout(catalog_version()), 5)
+
+    def test_outside_requests_use_primary(self):
+        self.assertEqual(Product.objects.all().db, "default")
+        with replica_reads():
+            self.assertEqual(Product.objects.all().db, "replica1")
+        self.assertTrue(router.allow_migrate("default", "store"))
+        self.assertFalse(router.allow_migrate("replica1", "store"))
+
+    def test_async_stack(self):
+        seen = {}
+
+        async def view(request):
+            seen["before"] = await sync_to_async(lambda: Product.objects.all().db)()
+            await sync_to_async(router.db_for_write)(Product)
+            seen["after"] = Product.objects.all().db
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        response = async_to_sync(middleware)(self.factory.get("/"))
+        self.assertEqual(seen, {"before": "replica1", "after": "default"})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        seen, _ = self.route(self.factory.get("/"))
+        self.assertEqual(seen["before"], "default")
+
+
+class AuthCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("shopper", "shopper@example.com", "pass")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def auth_queries(self, url):
+        tables = [f'"{model._meta.db_table}"' for model in (Session, get_user_model(), Customer)]
+        with record_queries() as recorder:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [sql for sql, _ in recorder.queries if any(table in sql for table in tables)]
+
+    def test_warm_requests_skip_session_and_user_queries(self):
+        self.assertNotEqual(self.auth_queries(reverse("cart-detail")), [])
+        self.assertEqual(self.auth_queries(reverse("cart-detail")), [])
+        self.assertEqual(self.auth_queries(reverse("home")), [])
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.client.get(reverse("cart-detail"))
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password("changed")
+            self.user.save()
+
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        response = self.client.get(reverse("cart-detail"))
+        self.assertFalse(response.context["user"].is_authenticated)
+
+    def test_customer_profile_is_cached_and_refreshed(self):
+        self.client.get(reverse("cart-detail"))
+        with self.assertRaises(Customer.DoesNotExist):
+            cache.get(user_cache_key(self.user.pk)).customer_profile
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(user=self.user, first_name="A", last_name="B", email="a@example.com", phone="1")
+
+        self.client.get(reverse("cart-detail"))
+        self.assertEqual(cache.get(user_cache_key(self.user.pk)).customer_profile.email, "a@example.com")
+
+
+class LazyCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = seed_catalog(brands=1, per_brand=1)[0]
+        cls.user = get_user_model().objects.create_user("browser", "browser@example.com", "pass")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_read_paths_do_not_create_a_cart(self):
+        response = self.client.get(reverse("cart-detail"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["total"], Decimal("0.00"))
+
+        self.assertRedirects(self.client.get(reverse("checkout-review")), reverse("checkout-address"))
+        response = self.client.get(reverse("checkout-address"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["cart"].subtotal, Decimal("0.00"))
+
+        self.assertRedirects(
+            self.client.post(reverse("place-order")), reverse("cart-detail"), fetch_redirect_response=False
+        )
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_first_add_creates_the_cart(self):
+        self.client.post(reverse("cart-add", args=[self.product.id]), {"quantity": 2})
+
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(cart.total_items, 2)
+        self.assertEqual(self.client.get(reverse("cart-detail")).context["total"], self.product.unit_price * 2)
+
+
+class GuestCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(brands=1, per_brand=3)
+        cls.user = get_user_model().objects.create_user("guest", "guest@example.com", "pass")
+
+    def add(self, product, quantity=1):
+        return self.client.post(reverse("cart-add", args=[product.id]), {"quantity": quantity})
+
+    def login(self):
+        # through the allauth form, client.login() has no guest cart to merge
+        response = self.client.post(reverse("account_login"), {"login": "guest", "password": "pass"})
+        self.assertEqual(response.status_code, 302)
+
+    def test_middleware_in_an_async_stack(self):
+        async def view(request):
+            request.guest_cart.add(self.products[0].id, 2)
+            return HttpResponse()
+
+        middleware = GuestCartMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        response = async_to_sync(middleware)(RequestFactory().get("/"))
+        self.assertTrue(response.cookies[COOKIE_NAME].value.startswith(f"{self.products[0].id}:2:"))
+
+    def test_guest_cart_lives_in_the_cookie(self):
+        with record_queries() as recorder:
+            self.add(self.products[0], 2)
+            self.add(self.products[1])
+
+        # one product lookup per add, nothing written
+        self.assertEqual(recorder.count, 2, recorder.report())
+        self.assertTrue(all(sql.startswith("SELECT") for sql, _ in recorder.queries))
+        self.assertTrue(self.client.cookies[COOKIE_NAME].value.startswith(
+            f"{self.products[0].id}:2|{self.products[1].id}:1:"
+        ))
+        response = self.client.get(reverse("cart-detail"))
+        self.assertEqual([line["quantity"] for line in response.context["lines"]], [2, 1])
+        self.assertEqual(response.context["cart_count"], 3)
+        self.assertFalse(Cart.objects.exists())
+
+        self.client.post(reverse("cart-decrement", args=[self.products[0].id]))
+        self.client.post(reverse("cart-remove", args=[self.products[1].id]))
+        self.assertEqual(self.client.get(reverse("cart-detail")).context["cart_count"], 1)
+
+    def test_tampered_cookie_is_ignored(self):
+        self.add(self.products[0])
+        value = self.client.cookies[COOKIE_NAME].value
+        self.client.cookies[COOKIE_NAME] = value.replace(f"{self.products[0].id}:1", f"{self.products[0].id}:9")
+
+        self.assertEqual(self.client.get(reverse("cart-detail")).context["lines"], [])
+
+    def test_login_merges_into_the_opened_cart(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=1)
+
+        self.add(self.products[0], 2)
+        self.add(self.products[1])
+        self.login()
+
+        quantities = dict(cart.items.values_list("product_id", "quantity"))
+        self.assertEqual(quantities, {self.products[0].id: 3, self.products[1].id: 1})
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 1)
+
+        # the cookie is gone once merged, a second login adds nothing
+        self.client.get(reverse("cart-detail"))
+        self.client.logout()
+        self.login()
+        self.assertEqual(cart.items.get(product=self.products[0]).quantity, 3)
+
+
+class CartTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(brands=1, per_brand=3)
+        cls.user = get_user_model().objects.create_user("shopper", "shopper@example.com", "pass")
+
+    def test_one_aggregate_for_both_totals(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=quantity)
+            for product, quantity in zip(self.products, (1, 2, 3))
+        ])
+        cart = Cart.objects.get(pk=cart.pk)
+
+        with self.assertNumQueries(1):
+            # 40 + 2 * 47 + 3 * 54
+            self.assertEqual((cart.total_items, cart.subtotal), (6, Decimal("296.00")))
+        self.assertEqual(async_to_sync(cart.items.all().atotals)(), {"total_items": 6, "subtotal": Decimal("296.00")})
+
+    def test_empty_and_unsaved_carts(self):
+        with self.assertNumQueries(0):
+            self.assertEqual((Cart(user=self.user).total_items, Cart(user=self.user).subtotal), (0, Decimal("0.00")))
+
+        cart = Cart.objects.create(user=self.user)
+        self.assertEqual((cart.total_items, cart.subtotal), (0, Decimal("0.00")))
+
+
+class CartJsonTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(brands=1, per_brand=3)
+        cls.user = get_user_model().objects.create_user("shopper", "shopper@example.com", "pass")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def post(self, url_name, product, **data):
+        return self.client.post(reverse(url_name, args=[product.id]), data, HTTP_ACCEPT="application/json")
+
+    def test_line_and_totals(self):
+        first, second = self.products[:2]
+        self.post("cart-add", first, quantity=2)
+        response = self.post("cart-add", second)
+
+        self.assertEqual(response.json(), {
+            "line": {"product_id": second.id, "quantity": 1, "unit_price": "47.00", "line_total": "47.00"},
+            "cart": {"total_items": 3, "subtotal": "127.00"},
+        })
+
+        data = self.post("cart-decrement", first).json()
+        self.assertEqual(data["line"]["quantity"], 1)
+        self.assertEqual(data["cart"], {"total_items": 2, "subtotal": "87.00"})
+
+        data = self.post("cart-remove", second).json()
+        self.assertEqual(data["line"], {"product_id": second.id, "quantity": 0, "unit_price": None, "line_total": "0.00"})
+        self.assertEqual(data["cart"], {"total_items": 1, "subtotal": "40.00"})
+
+    def test_form_posts_still_redirect(self):
+        response = self.client.post(reverse("cart-add", args=[self.products[0].id]), {"quantity": 1})
+        self.assertRedirects(response, reverse("cart-detail"), fetch_redirect_response=False)
+
+        response = self.client.post(reverse("cart-add", args=[self.products[0].id]), {"quantity": 1, "format": "json"})
+        self.assertEqual(response.json()["line"]["quantity"], 2)
+
+    def test_guest_gets_the_same_shape(self):
+        self.client.logout()
+        data = self.post("cart-add", self.products[2], quantity=3).json()
+        self.assertEqual(data, {
+            "line": {"product_id": self.products[2].id, "quantity": 3, "unit_price": "54.00", "line_total": "162.00"},
+            "cart": {"total_items": 3, "subtotal": "162.00"},
+        })
+
+    def test_quantity_is_capped(self):
+        product = self.products[0]
+        self.assertEqual(self.post("cart-add", product, quantity=MAX_LINE_QUANTITY + 100).json()["line"]["quantity"],
+                         MAX_LINE_QUANTITY)
+        self.assertEqual(self.post("cart-add", product, quantity=5).json()["line"]["quantity"], MAX_LINE_QUANTITY)
+        self.assertEqual(self.post("cart-increment", product).json()["line"]["quantity"], MAX_LINE_QUANTITY)
+
+        # straight through the helper, on an existing line and a new one
+        cart = get_or_create_cart(self.user)
+        add_to_cart(cart, self.products[1].id, MAX_LINE_QUANTITY - 1)
+        add_to_cart(cart, self.products[1].id, 10)
+        add_to_cart(cart, self.products[2].id, 10 ** 6)
+        self.assertEqual(set(cart.items.values_list("quantity", flat=True)), {MAX_LINE_QUANTITY})
+
+
+class CartBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(brands=1, per_brand=4)
+        cls.user = get_user_model().objects.create_user("shopper", "shopper@example.com", "pass")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def batch(self, items, **payload):
+        payload["items"] = [{"product_id": product_id, "quantity": quantity} for product_id, quantity in items]
+        return self.client.post(reverse("cart-batch"), payload, content_type="application/json")
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list("product_id", "quantity"))
+
+    def test_upsert_and_delete(self):
+        p = [product.id for product in self.products]
+        self.batch([(p[0], 2), (p[1], 1)])
+
+        response = self.batch([(p[0], 5), (p[1], 0), (p[2], 1), (999999, 3)])
+        data = response.json()
+
+        self.assertEqual(self.quantities(), {p[0]: 5, p[2]: 1})
+        self.assertEqual([line["quantity"] for line in data["lines"]], [5, 1])
+        self.assertEqual(data["cart"], {"total_items": 6, "subtotal": "254.00"})
+        self.assertEqual(data["unknown_products"], [999999])
+
+    def test_replace(self):
+        p = [product.id for product in self.products]
+        self.batch([(p[0], 2), (p[1], 1), (p[2], 1)])
+
+        self.batch([(p[1], 4), (p[3], 1)], replace=True)
+        self.assertEqual(self.quantities(), {p[1]: 4, p[3]: 1})
+
+        self.batch([], replace=True)
+        self.assertEqual(self.quantities(), {})
+
+    def test_form_post(self):
+        p = [product.id for product in self.products]
+        response = self.client.post(reverse("cart-batch"), {"product_id": [p[0], p[1]], "quantity": [3, 1]})
+        self.assertRedirects(response, reverse("cart-detail"), fetch_redirect_response=False)
+        self.assertEqual(self.quantities(), {p[0]: 3, p[1]: 1})
+
+    def test_bad_operations_are_rejected_whole(self):
+        p = self.products[0].id
+        self.batch([(p, 2)])
+
+        for items in (
+            [(p, 1), (self.products[1].id, -1)],
+            [(p, MAX_LINE_QUANTITY + 1)],
+            [(p, "lots")],
+            [("abc", 1)],
+        ):
+            with self.subTest(items=items):
+                response = self.batch(items)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+        response = self.client.post(reverse("cart-batch"), "{not json", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse("cart-batch"), {"items": [{"quantity": 1}]}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(self.quantities(), {p: 2})
+
+
+class PruneCartsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(brands=1, per_brand=2)
+        User = get_user_model()
+        cls.users = [User.objects.create_user(f"cart-{i}", f"cart-{i}@example.com") for i in range(4)]
+
+    def cart(self, user, status, days_old, address=False):
+        cart = Cart.objects.create(user=user, status=status)
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=2) for product in self.products])
+        if address:
+            ShippingAddress.objects.create(
+                user=user, cart=cart, full_name="Old", phone="0790000000", city="Amman", street="Main"
+            )
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now() - timedelta(days=days_old))
+        return cart
+
+    def prune(self, *args):
+        out = StringIO()
+        call_command("prune_carts", "--sleep", "0", "--batch-size", "1", "--json", *args, stdout=out)
+        return json.loads(out.getvalue())
+
+    def test_prunes_old_carts_in_batches(self):
+        stale = self.cart(self.users[0], Cart.Status.OPENED, 120)
+        live = self.cart(self.users[1], Cart.Status.OPENED, 5)
+        frozen = self.cart(self.users[2], Cart.Status.FROZEN, 400, address=True)
+        recent_frozen = self.cart(self.users[3], Cart.Status.FROZEN, 30, address=True)
+
+        metrics = self.prune()
+
+        self.assertEqual(metrics["OPENED"]["carts"], 1)
+        self.assertEqual(metrics["OPENED"]["items"], 2)
+        self.assertEqual(metrics["FROZEN"]["addresses"], 1)
+        self.assertEqual(
+            set(Cart.objects.values_list("pk", flat=True)), {live.pk, recent_frozen.pk}
+        )
+        self.assertFalse(CartItem.objects.filter(cart_id__in=[stale.pk, frozen.pk]).exists())
+        # FROZEN carts are archived by default, OPENED ones aren't
+        self.assertEqual(list(ArchivedCart.objects.values_list("cart_id", flat=True)), [frozen.pk])
+
+    def test_archive_keeps_items_and_address(self):
+        frozen = self.cart(self.users[0], Cart.Status.FROZEN, 400, address=True)
+
+        metrics = self.prune("--archive", "--opened-days", "0")
+
+        self.assertEqual(metrics["FROZEN"]["archived"], 1)
+        archived = ArchivedCart.objects.get(cart_id=frozen.pk)
+        self.assertEqual(archived.items, [[product.pk, 2] for product in self.products])
+        self.assertEqual(archived.shipping_address["full_name"], "Old")
+
+    def test_no_archive(self):
+        frozen = self.cart(self.users[0], Cart.Status.FROZEN, 400, address=True)
+        stale = self.cart(self.users[1], Cart.Status.OPENED, 120)
+
+        with self.assertRaises(CommandError):
+            self.prune("--archive", "--no-archive")
+        metrics = self.prune("--no-archive")
+
+        self.assertEqual((metrics["FROZEN"]["archived"], metrics["OPENED"]["archived"]), (0, 0))
+        self.assertFalse(Cart.objects.filter(pk__in=[frozen.pk, stale.pk]).exists())
+        self.assertFalse(ArchivedCart.objects.exists())
+
+    def test_archive_includes_opened_carts(self):
+        stale = self.cart(self.users[0], Cart.Status.OPENED, 120)
+        self.prune("--archive")
+        self.assertEqual(ArchivedCart.objects.get().cart_id, stale.pk)
+
+    def test_max_batches_stops_early(self):
+        for user in self.users[:3]:
+            self.cart(user, Cart.Status.OPENED, 120)
+
+        metrics = self.prune("--max-batches", "2", "--frozen-days", "0")
+
+        self.assertEqual(metrics["OPENED"]["carts"], 2)
+        self.assertTrue(metrics["OPENED"]["stopped_early"])
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_adding_to_an_old_cart_marks_it_active(self):
+        cart = self.cart(self.users[0], Cart.Status.OPENED, 120)
+        self.assertEqual(get_or_create_cart(self.users[0]).pk, cart.pk)
+
+        self.prune()
+        self.assertTrue(Cart.objects.filter(pk=cart.pk).exists())
+
+
+class PlaceOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(brands=1, per_brand=2)
+        cls.user = get_user_model().objects.create_user("buyer", "buyer@example.com", "pass")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+        ShippingAddress.objects.create(
+            user=self.user, cart=self.cart, full_name="Buyer", phone="0790000000", city="Amman", street="Main"
+        )
+
+    def place_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("place-order"))
+
+    def test_short_stock_is_rejected(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=5)
+        CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=21)
+
+        self.assertRedirects(self.place_order(), reverse("cart-detail"), fetch_redirect_response=False)
+
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in self.products]).values_list("inventory", flat=True)),
+            [20, 20],
+        )
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.status, Cart.Status.OPENED)
+
+    def test_checkout_takes_the_stock_and_freezes_the_cart(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=20)
+        CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=3)
+        before = catalog_version()
+        last_update = self.products[0].last_update
+
+        self.assertRedirects(self.place_order(), reverse("checkout-success"), fetch_redirect_response=False)
+
+        sold_out, partial = Product.objects.filter(pk__in=[p.pk for p in self.products]).order_by("id")
+        self.assertEqual((sold_out.inventory, sold_out.in_stock), (0, False))
+        self.assertEqual((partial.inventory, partial.in_stock), (17, True))
+        self.assertGreater(sold_out.last_update, last_update)
+        self.assertFalse(CatalogListing.objects.get(pk=sold_out.pk).in_stock)
+        self.assertNotEqual(catalog_version(), before)
+
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.status, Cart.Status.FROZEN)
+        self.assertEqual(OrderItem.objects.filter(order__customer__user=self.user).count(), 2)
+
+    def test_checkout_that_sells_nothing_out_keeps_the_catalog_cache(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=2)
+        before = catalog_version()
+
+        self.assertRedirects(self.place_order(), reverse("checkout-success"), fetch_redirect_response=False)
+
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).inventory, 18)
+        self.assertEqual(catalog_version(), before)
+
+    def test_bench_cleanup_leaves_real_brands_alone(self):
+        real = Brand.objects.create(name="Bench")
+        bench = Brand.objects.create(name=f"bench-checkout-{'a' * 32}")
+        BenchCheckout().cleanup()
+
+        self.assertTrue(Brand.objects.filter(pk=real.pk).exists())
+        self.assertFalse(Brand.objects.filter(pk=bench.pk).exists())
+
+    def test_resubmitting_an_ordered_cart_orders_nothing(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=1)
+        self.place_order()
+        self.assertRedirects(self.place_order(), reverse("cart-detail"), fetch_redirect_response=False)
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).inventory, 19)
+
+
+IMPORT_COLUMNS = [
+    "sku", "title", "brand", "gender", "dial_color", "strap_color", "strap_material",
+    "size", "description", "unit_price", "inventory", "image",
+]
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImportCatalogTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def row(self, sku, **overrides):
+        row = {
+            "sku": sku, "title": f"Watch {sku}", "brand": "Imported", "gender": "men", "dial_color": "black",
+            "strap_color": "brown", "strap_material": "leather", "size": "40", "description": "Automatic",
+            "unit_price": "199.90", "inventory": "5", "image": "",
+        }
+        row.update(overrides)
+        return row
+
+    def run_import(self, rows, *args, encoding="utf-8"):
+        path = os.path.join(self.dir, "catalog.csv")
+        with open(path, "w", newline="", encoding=encoding) as f:
+            writer = csv.DictWriter(f, fieldnames=IMPORT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        out, err = StringIO(), StringIO()
+        call_command("import_catalog", path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_dry_run_writes_nothing(self):
+        out, _ = self.run_import([self.row("A-1"), self.row("A-2")], "--dry-run")
+
+        self.assertIn("2 created", out)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Brand.objects.exists())
+
+    def test_upsert_on_sku(self):
+        self.run_import([self.row("A-1"), self.row("A-2")])
+        out, _ = self.run_import([self.row("A-1", unit_price="150.00", inventory="0"), self.row("A-3")])
+
+        self.assertIn("1 created, 1 updated", out)
+        self.assertEqual(Product.objects.count(), 3)
+        updated = Product.objects.get(sku="A-1")
+        self.assertEqual((updated.unit_price, updated.in_stock), (Decimal("150.00"), False))
+        self.assertEqual(CatalogListing.objects.get(pk=updated.pk).unit_price, Decimal("150.00"))
+
+    def test_excel_bom(self):
+        out, _ = self.run_import([self.row("E-1"), self.row("E-2")], encoding="utf-8-sig")
+        self.assertIn("2 created, 0 updated, 0 skipped", out)
+
+    def test_rows_over_the_column_limits_are_skipped(self):
+        bad = [
+            self.row("B-1", title="x" * 256),
+            self.row("B-2", unit_price="10000.00"),
+            self.row("B-3", inventory="-1"),
+            self.row("B-4", size="99999999999"),
+            self.row("B-5", brand="b" * 101),
+            self.row("B-6", dial_color="c" * 51),
+            self.row("s" * 65),
+        ]
+        for args in (["--dry-run"], []):
+            out, err = self.run_import(bad + [self.row("OK-1")], *args)
+            self.assertIn("7 skipped", out)
+            self.assertEqual(err.count("skipped"), 7)
+
+        self.assertEqual(list(Product.objects.values_list("sku", flat=True)), ["OK-1"])
+
+    def test_image_only_changes_for_rows_that_attached_one(self):
+        with open(os.path.join(self.dir, "new.jpg"), "wb") as f:
+            f.write(b"not really a jpeg")
+        self.run_import([self.row("C-1"), self.row("C-2")])
+        Product.objects.filter(sku="C-1").update(image="products/kept.jpg")
+
+        self.run_import(
+            [self.row("C-1"), self.row("C-2", image="new.jpg"), self.row("C-3", image="missing.jpg")],
+            "--images", self.dir,
+        )
+
+        images = dict(Product.objects.values_list("sku", "image"))
+        self.assertEqual(images["C-1"], "products/kept.jpg")
+        self.assertTrue(images["C-2"].startswith("products/new_"))
+        self.assertIn(images["C-3"], (None, ""))
+
+    def test_same_file_name_different_image(self):
+        default_storage.save("products/strap.jpg", ContentFile(b"someone else's strap"))
+        with open(os.path.join(self.dir, "strap.jpg"), "wb") as f:
+            f.write(b"our strap")
+
+        out, _ = self.run_import([self.row("D-1", image="strap.jpg")], "--images", self.dir)
+        name = Product.objects.get(sku="D-1").image.name
+        self.assertRegex(name, r"^products/strap_[0-9a-f]{12}\.jpg$")
+        with default_storage.open(name) as f:
+            self.assertEqual(f.read(), b"our strap")
+        self.assertIn("1 images attached", out)
+
+        # importing the same file again reuses it
+        out, _ = self.run_import([self.row("D-2", image="strap.jpg")], "--images", self.dir)
+        self.assertEqual(Product.objects.get(sku="D-2").image.name, name)
+        self.assertIn("0 images attached", out)
+
+
+class CatalogFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(brands=2, per_brand=3)
+        cls.staff = get_user_model().objects.create_user("staff", "staff@example.com", "pass", is_staff=True)
+        cls.buyer = get_user_model().objects.create_user("buyer", "buyer@example.com", "pass")
+
+        # everything last changed a while ago
+        cls.since = timezone.now() - timedelta(days=1)
+        Product.objects.update(last_update=cls.since - timedelta(days=1))
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def feed(self, fmt="jsonl", **params):
+        response = self.client.get(reverse("catalog-feed", args=[fmt]), params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def jsonl(self, **params):
+        return [json.loads(line) for line in self.feed(**params).decode().splitlines()]
+
+    def test_jsonl(self):
+        rows = self.jsonl()
+        self.assertEqual([row["id"] for row in rows], [p.id for p in self.products])
+        self.assertEqual(rows[0]["brand"], "Brand 0")
+        self.assertEqual(rows[0]["unit_price"], "40.00")
+        self.assertEqual(list(rows[0]), FEED_FIELDS)
+
+    def test_csv_and_gzip(self):
+        rows = list(csv.DictReader(StringIO(self.feed("csv").decode())))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1]["title"], "Brand 0 watch 1")
+
+        self.assertEqual(gzip.decompress(self.feed("csv", gzip="1")), self.feed("csv"))
+
+    def test_since(self):
+        self.assertEqual(self.jsonl(since=self.since.isoformat()), [])
+        self.assertEqual(len(self.jsonl(since=(self.since - timedelta(days=2)).date().isoformat())), 6)
+
+        product = self.products[2]
+        product.title = "Renamed"
+        product.save()
+        self.assertEqual([row["title"] for row in self.jsonl(since=self.since.isoformat())], ["Renamed"])
+
+    def test_since_picks_up_stock_taken_at_checkout(self):
+        # place_order writes stock with bulk_update, which has to bump last_update itself
+        self.client.force_login(self.buyer)
+        cart = Cart.objects.create(user=self.buyer)
+        ShippingAddress.objects.create(
+            user=self.buyer, cart=cart, full_name="Buyer", phone="0790000000", city="Amman", street="Main"
+        )
+        CartItem.objects.create(cart=cart, product=self.products[4], quantity=20)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("place-order"))
+
+        self.client.force_login(self.staff)
+        rows = self.jsonl(since=self.since.isoformat())
+        self.assertEqual([(row["id"], row["inventory"], row["in_stock"]) for row in rows],
+                         [(self.products[4].id, 0, False)])
+
+    def test_async_chunks_are_pulled_one_at_a_time(self):
+        pulled = []
+
+        def chunks():
+            for n in range(3):
+                pulled.append(n)
+                yield n
+
+        async def first_then_rest():
+            stream = aiter_chunks(chunks())
+            first = await anext(stream)
+            seen = list(pulled)
+            return first, seen, [chunk async for chunk in stream]
+
+        self.assertEqual(async_to_sync(first_then_rest)(), (0, [0], [1, 2]))
+
+    def test_asgi_requests_stream_asynchronously(self):
+        request = AsyncRequestFactory().get(reverse("catalog-feed", args=["jsonl"]))
+        request.user = self.staff
+        response = catalog_feed(request, "jsonl")
+        self.assertTrue(response.is_async)
+
+        async def read():
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        self.assertEqual(async_to_sync(read)(), self.feed())
+
+    def test_bad_requests(self):
+        url = reverse("catalog-feed", args=["jsonl"])
+        self.assertEqual(self.client.get(url, {"since": "yesterday"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("catalog-feed", args=["xml"])).status_code, 404)
+
+        self.client.force_login(self.buyer)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImageDerivativeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        buffer = BytesIO()
+        Image.new("RGB", (2000, 1000), "navy").save(buffer, "JPEG")
+        self.name = default_storage.save("products/dial.jpg", ContentFile(buffer.getvalue()))
+
+    def render(self, name):
+        image = Product(image=name).image
+        return Template("{% load store_images %}{% image_variant image 'card' %}|{% image_srcset image %}").render(
+            Context({"image": image})
+        )
+
+    def test_names_differ_per_source_path(self):
+        names = {
+            derivative_name(name, "card")
+            for name in ("products/foo.jpg", "products/foo.png", "other/foo.jpg", "products/foo_x1.jpg")
+        }
+        self.assertEqual(len(names), 4)
+        self.assertTrue(all(name.endswith("_card.webp") for name in names))
+        self.assertEqual(derivative_name("products/foo.jpg", "card"), derivative_name("products/foo.jpg", "card"))
+
+    def test_generate(self):
+        created = generate_derivatives(self.name)
+        self.assertEqual(created, [derivative_name(self.name, size) for size in IMAGE_SIZES])
+
+        for size, width in IMAGE_SIZES.items():
+            with default_storage.open(derivative_name(self.name, size)) as f:
+                image = Image.open(f)
+                self.assertEqual((image.format, image.width), ("WEBP", width))
+
+        # already there, nothing to do unless forced
+        self.assertEqual(generate_derivatives(self.name), [])
+        self.assertEqual(len(generate_derivatives(self.name, force=True)), len(IMAGE_SIZES))
+
+    def test_template_falls_back_to_the_original(self):
+        original = default_storage.url(self.name)
+        self.assertEqual(self.render(self.name), f"{original}|")
+
+        # the miss is cached, the next render doesn't ask the storage again
+        with mock.patch.object(default_storage, "exists", side_effect=AssertionError("storage hit")):
+            self.assertEqual(self.render(self.name), f"{original}|")
+
+        generate_derivatives(self.name)
+        record_derivatives(self.name)
+        card = default_storage.url(derivative_name(self.name, "card"))
+        variant, srcset = self.render(self.name).split("|")
+        self.assertEqual(variant, card)
+        self.assertEqual(srcset.count("w, "), len(IMAGE_SIZES) - 1)
+        self.assertIn(f"{card} 480w", srcset)
+
+    def test_hits_are_kept(self):
+        generate_derivatives(self.name)
+        self.assertTrue(derivative_exists(self.name, "thumb"))
+        cache.clear()
+        with mock.patch.object(default_storage, "exists", side_effect=AssertionError("storage hit")):
+            self.assertTrue(derivative_exists(self.name, "thumb"))
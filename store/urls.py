@@ -4,7 +4,8 @@ from .views import (
     ProductDetailView,
     CartAddView,
     CartDetailView,
-    CartClearView, HomeView, ProductUpdateView, CartDecrementView, CartIncrementView, CartRemoveItemView,
+    CartClearView, CartBatchView, HomeView, ProductUpdateView, CartDecrementView, CartIncrementView, CartRemoveItemView,
+    ProductLikeView,
 )
 
 urlpatterns = [
@@ -16,10 +17,15 @@ urlpatterns = [
     path("cart/decrement/<int:product_id>/", CartDecrementView.as_view(), name="cart-decrement"),
     path("cart/remove/<int:product_id>/", CartRemoveItemView.as_view(), name="cart-remove"),
     path("cart/clear/", CartClearView.as_view(), name="cart-clear"),
+    path("cart/batch/", CartBatchView.as_view(), name="cart-batch"),
     path("products/<int:id>/edit/", ProductUpdateView.as_view(), name="product-edit"),
+    path("products/<int:id>/like/", ProductLikeView.as_view(), name="product-like"),
+    path("products/<int:id>/unlike/", ProductLikeView.as_view(liked=False), name="product-unlike"),
     path("checkout/address/", views.checkout_address, name="checkout-address"),
     path("checkout/review/", views.checkout_review, name="checkout-review"),
     path("checkout/place-order/", views.place_order, name="place-order"),
     path("checkout/success/", views.checkout_success, name="checkout-success"),
+    path("feeds/catalog.<str:fmt>", views.catalog_feed, name="catalog-feed"),
+    path("staff/sales/", views.sales_dashboard, name="sales-dashboard"),
 
 ]
\ No newline at end of file
@@ -1,72 +1,237 @@
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.http import Http404
-from django.shortcuts import get_object_or_404, render
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
 from django.urls import reverse
 from django.views import View
 from django.shortcuts import redirect
 from django.views.generic import DetailView, TemplateView, UpdateView, ListView
 from .forms import ShippingAddressForm
 from .models import Product, CartItem, Cart, Customer, Order, OrderItem
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.views.decorators.http import require_POST
 from django.utils.decorators import method_decorator
+from django.utils import timezone
 from django.db import transaction
-from .cart_utils import get_or_create_cart
+from .cart_utils import (
+    MAX_LINE_QUANTITY,
+    add_to_cart,
+    aget_cart_summary,
+    apeek_cart,
+    decrement_cart_item,
+    get_or_create_cart,
+    invalidate_cart_summary,
+    peek_cart,
+    set_cart_quantities,
+)
+from .pagination import akeyset_paginate
+from .facets import aget_facets
+from .catalog_cache import aget_or_set_catalog, aget_product_version, bump_catalog_version, invalidate_product_versions
+from .feeds import FEED_FORMATS, aiter_chunks, buffered, feed_chunks, feed_rows, gzip_chunks, parse_since
+from .filters import apply_filters, canonical_query, parse_filters
+import asyncio
+import hashlib
+import json
+from datetime import timedelta
 from decimal import Decimal
 from django.views.generic import ListView
-from .models import Product, Brand
+from .listing import sync_listings
+from .rollups import record_order_sales, sales_report
+from .models import Product, Brand, CatalogListing
+from likes.utils import aattach_likes, aget_like_info, get_like_info, like, unlike
+from tags.utils import aattach_tags
+from .tag_index import aproduct_ids_for_tags, tag_index_enabled
+
+async def load_request_user(request):
+    # Resolve the lazy user once, off the event loop. Without this the first
+    # request.user access (mixins, templates) would query from async code.
+    request.user = await request.auser()
+    return request.user
+
+async def acart_summary(request):
+    if request.user.is_authenticated:
+        return await aget_cart_summary(request.user)
+    if getattr(request, "guest_cart", None):
+        # the cookie has no prices, the badge only needs the count
+        return {"count": request.guest_cart.count, "subtotal": None}
+    return None
+
+async def abrand_list():
+    return [brand async for brand in Brand.objects.order_by("name")]
 
 class HomeView(ListView):
-    model = Product
+    # reads the narrow CatalogListing copy, not Product + Brand
+    model = CatalogListing
     template_name = "store/home.html"
     context_object_name = "products"
+    paginate_by = 24
+
+    # every ordering ends with id so keyset cursors are unique
+    sort_options = {
+        "newest": ("Newest", ("-id",)),
+        "price_asc": ("Price: low to high", ("unit_price", "id")),
+        "price_desc": ("Price: high to low", ("-unit_price", "-id")),
+        "title": ("Name", ("title", "id")),
+        # only offered while searching, `rank` comes from search_products
+        "relevance": ("Relevance", ("-rank", "-id")),
+    }
+    default_sort = "newest"
+
+    def get_search(self):
+        return self.get_filters()["q"]
+
+    def get_sort(self):
+        sort = self.request.GET.get("sort", "")
+        searching = bool(self.get_search())
+
+        if sort not in self.sort_options or (sort == "relevance" and not searching):
+            sort = "relevance" if searching else self.default_sort
+        return sort
+
+    def get_ordering(self):
+        return self.sort_options[self.get_sort()][1]
+
+    def get_filters(self):
+        if not hasattr(self, "_filters"):
+            self._filters = parse_filters(self.request.GET)
+        return self._filters
+
+    def get_sort_param(self):
+        # sort only shows up in the URL when it isn't the default
+        sort = self.get_sort()
+        default = "relevance" if self.get_search() else self.default_sort
+        return "" if sort == default else sort
+
+    def get_url(self, filters=None, cursor=None):
+        query = canonical_query(filters or self.get_filters(), sort=self.get_sort_param(), cursor=cursor)
+        return f"{self.request.path}?{query}" if query else self.request.path
+
+    async def get(self, request, *args, **kwargs):
+        # One URL per filter state (sorted brands, deduped genders, 2dp prices,
+        # no empty fields), so the caches below get one entry per state
+        canonical = canonical_query(
+            self.get_filters(),
+            sort=self.get_sort_param(),
+            cursor=request.GET.get("cursor", ""),
+        )
+        if request.GET.urlencode() != canonical:
+            return redirect(f"{request.path}?{canonical}" if canonical else request.path)
+
+        await load_request_user(request)
+        await self.aresolve_tags()
+        self.object_list = self.get_queryset()
+
+        # The reads below don't depend on each other, so they are started
+        # together. Cache lookups overlap; the async ORM in Django 5.x still
+        # hands queries to a single sync thread, so DB work runs back to back.
+        self.page, self.brands, self.facets, request.cart_summary = await asyncio.gather(
+            self.aget_page(),
+            aget_or_set_catalog("brands", {}, abrand_list),
+            aget_facets(self.get_base_queryset(), self.get_filters(), exclude=self.get_prefiltered()),
+            acart_summary(request),
+        )
 
-    def get_queryset(self):
-        qs = Product.objects.select_related("brand").all().order_by("-id")
+        # like counts + "liked by me" (two queries) and tags (one) for the
+        # whole page; the cached page holds no per-user data, so after it
+        await asyncio.gather(
+            aattach_likes(self.page.object_list, request.user, model=Product),
+            aattach_tags(self.page.object_list, model=Product),
+        )
+
+        return self.render_to_response(self.get_context_data())
 
-        # Search
-        q = (self.request.GET.get("q") or "").strip()
-        if q:
-            qs = qs.filter(title__icontains=q)
+    async def aresolve_tags(self):
+        # with the in-memory tag index on, multi-tag AND/OR is answered from
+        # per-process sets and the queries get a plain id list
+        filters = self.get_filters()
+        if filters["tag"] and tag_index_enabled():
+            self.tag_ids = await aproduct_ids_for_tags(filters["tag"], filters["tag_mode"] == "all")
 
-        #CHECKBOX filters
-        brands_raw = self.request.GET.getlist("brand")     # ['1','2',''] possible
-        genders_raw = self.request.GET.getlist("gender")   # ['men','women',''] possible
+    def get_prefiltered(self):
+        return {"tag"} if getattr(self, "tag_ids", None) is not None else set()
 
-        # keep only valid values (prevents "" crash)
-        brands = [b for b in brands_raw if str(b).isdigit()]
-        allowed_genders = {"men", "women", "unisex"}
-        genders = [g for g in genders_raw if g in allowed_genders]
+    def get_base_queryset(self):
+        qs = CatalogListing.objects.all()
+        if "tag" in self.get_prefiltered():
+            qs = qs.filter(id__in=self.tag_ids)
+        return qs
+
+    def get_queryset(self):
+        qs = apply_filters(self.get_base_queryset(), self.get_filters(), exclude=self.get_prefiltered())
+        return qs.order_by(*self.get_ordering())
 
-        if brands:
-            qs = qs.filter(brand_id__in=brands)
+    async def aget_page(self):
+        # keyset instead of Paginator: no OFFSET scan and no COUNT(*)
+        cursor = self.request.GET.get("cursor")
 
-        if genders:
-            qs = qs.filter(gender__in=genders)
+        async def fetch_page():
+            return await akeyset_paginate(
+                self.object_list, self.get_ordering(), cursor=cursor, per_page=self.paginate_by,
+            )
 
-        #Price range
-        min_price = (self.request.GET.get("min_price") or "").strip()
-        max_price = (self.request.GET.get("max_price") or "").strip()
+        # the queryset is lazy, on a cache hit it never runs
+        return await aget_or_set_catalog(
+            "page", dict(self.get_filters(), sort=self.get_sort(), cursor=cursor), fetch_page,
+        )
 
-        if min_price:
-            try:
-                qs = qs.filter(unit_price__gte=Decimal(min_price))
-            except:
-                pass
+    def paginate_queryset(self, queryset, page_size):
+        # self.page was fetched in get()
+        return None, self.page, self.page.object_list, self.page.has_other_pages()
 
-        if max_price:
-            try:
-                qs = qs.filter(unit_price__lte=Decimal(max_price))
-            except:
-                pass
+    def page_url(self, cursor):
+        return self.get_url(cursor=cursor)
 
-        return qs
+    def price_url(self, min_price, max_price):
+        # buckets are [low, high), the max_price filter is inclusive
+        if max_price is not None:
+            max_price = max_price - Decimal("0.01")
+        return self.get_url(dict(self.get_filters(), min_price=min_price, max_price=max_price))
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
 
+        page = ctx["page_obj"]
+        ctx["next_url"] = self.page_url(page.next_cursor) if page.has_next else None
+        ctx["previous_url"] = self.page_url(page.previous_cursor) if page.has_previous else None
+
+        ctx["sort_options"] = [
+            (key, label) for key, (label, _) in self.sort_options.items()
+            if key != "relevance" or self.get_search()
+        ]
+
         # Only what we use
-        ctx["brands"] = Brand.objects.order_by("name")
+        ctx["brands"] = self.brands
+
+        # Sidebar counts, one grouped query (cached per filter state)
+        facets = self.facets
+        ctx["brand_facets"] = [(b, facets["brand"].get(b.id, 0)) for b in ctx["brands"]]
+        ctx["gender_facets"] = [
+            (value, label, facets["gender"].get(value, 0)) for value, label in Product.GENDER_CHOICES
+        ]
+        ctx["price_facets"] = [
+            dict(bucket, url=self.price_url(bucket["min_price"], bucket["max_price"]))
+            for bucket in facets["price"]
+        ]
+
+        # Tag chips: each links to the listing without that tag, card tags
+        # link to the listing with that tag added
+        filters = self.get_filters()
+        ctx["selected_tags"] = [
+            (label, self.get_url(dict(filters, tag=[t for t in filters["tag"] if t != label])))
+            for label in filters["tag"]
+        ]
+        if len(filters["tag"]) > 1:
+            other_mode = "any" if filters["tag_mode"] == "all" else "all"
+            ctx["tag_mode_url"] = self.get_url(dict(filters, tag_mode=other_mode))
+        for product in page.object_list:
+            product.tag_links = [
+                (label, self.get_url(dict(filters, tag=sorted({*filters["tag"], label}))))
+                for label in product.tag_list
+            ]
 
         # Keep selected values checked
         ctx["selected"] = {
@@ -75,16 +240,84 @@ class HomeView(ListView):
             "gender": self.request.GET.getlist("gender"),
             "min_price": self.request.GET.get("min_price", ""),
             "max_price": self.request.GET.get("max_price", ""),
+            "sort": self.get_sort(),
+            "tag": filters["tag"],
+            "tag_mode": filters["tag_mode"],
         }
 
         return ctx
 
+def product_etag(request, id, version, summary, likes):
+    # the page also shows who is logged in, their basket badge and the likes
+    user_part = "anon"
+    if request.user.is_authenticated:
+        user_part = f"{request.user.pk}:{summary['count']}:{likes['liked']}"
+    elif summary:
+        user_part = f"guest:{summary['count']}"
+
+    raw = f"{id}:{version.timestamp()}:{likes['count']}:{user_part}"
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
 class ProductDetailView(DetailView):
     model = Product
     template_name = "store/product_detail.html"
     context_object_name = "product"
     pk_url_kwarg = "id"
 
+    async def get(self, request, *args, **kwargs):
+        await load_request_user(request)
+        product_id = kwargs[self.pk_url_kwarg]
+
+        # cached last_update + basket badge, plus the two small like lookups
+        version, request.cart_summary, likes = await asyncio.gather(
+            aget_product_version(product_id),
+            acart_summary(request),
+            aget_like_info(Product, [product_id], request.user),
+        )
+        if version is None:
+            raise Http404("No Product matches the given query.")
+
+        likes = likes[product_id]
+        etag = product_etag(request, product_id, version, request.cart_summary, likes)
+        # pages with a basket badge change with the basket too, they rely on the ETag only
+        has_basket = request.user.is_authenticated or request.cart_summary
+        last_modified = None if has_basket else int(version.timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            self.object = await self.get_queryset().aget(pk=product_id)
+            self.object.like_count = likes["count"]
+            self.object.liked_by_me = likes["liked"]
+            response = self.render_to_response(self.get_context_data(object=self.object))
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+
+        patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+        return response
+
+
+@method_decorator(require_POST, name="dispatch")
+class ProductLikeView(LoginRequiredMixin, View):
+    # POST is idempotent both ways: the unique index on LikedItem means a
+    # double click can't like twice, and unliking twice is a no-op
+    liked = True
+
+    def post(self, request, id):
+        if not Product.objects.filter(pk=id).exists():
+            raise Http404("No Product matches the given query.")
+
+        if self.liked:
+            like(request.user, Product, id)
+        else:
+            unlike(request.user, Product, id)
+
+        if not wants_json(request):
+            return redirect("product-detail", id=id)
+
+        info = get_like_info(Product, [id], request.user)[id]
+        return JsonResponse({"product_id": id, "liked": info["liked"], "count": info["count"]})
+
 
 class ProductUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     model = Product
@@ -98,40 +331,84 @@ class ProductUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     def get_success_url(self):
         return reverse("product-detail", kwargs={"id": self.object.id})
 
+def wants_json(request):
+    # opt-in: Accept: application/json, or a format=json form field
+    return "application/json" in request.headers.get("Accept", "") or request.POST.get("format") == "json"
+
+def cart_line_json(product_id, item, totals):
+    return JsonResponse({
+        "line": {
+            "product_id": product_id,
+            "quantity": item.quantity if item else 0,
+            "unit_price": item.product.unit_price if item else None,
+            "line_total": item.line_total if item else Decimal("0.00"),
+        },
+        "cart": totals,
+    })
+
+def cart_line_response(request, cart, product_id):
+    if not wants_json(request):
+        return redirect("cart-detail")
+
+    item = cart.items.select_related("product").filter(product_id=product_id).first()
+    return cart_line_json(product_id, item, cart.items.totals())
+
+def guest_line_response(request, product_id):
+    if not wants_json(request):
+        return redirect("cart-detail")
+
+    items = request.guest_cart.items()
+    item = next((item for item in items if item.product_id == product_id), None)
+    return cart_line_json(product_id, item, {
+        "total_items": sum(item.quantity for item in items),
+        "subtotal": sum((item.line_total for item in items), Decimal("0.00")),
+    })
+
+def guest_cart_add(request, product_id, quantity):
+    # guests only change their cookie, no Cart row until they log in
+    if not Product.objects.filter(pk=product_id).exists():
+        raise Http404("No Product matches the given query.")
+
+    try:
+        request.guest_cart.add(product_id, quantity)
+    except ValueError as e:
+        if wants_json(request):
+            return JsonResponse({"error": str(e)}, status=400)
+        messages.error(request, str(e))
+        return redirect("cart-detail")
+
+    return guest_line_response(request, product_id)
+
 @method_decorator(require_POST, name="dispatch")
-class CartAddView(LoginRequiredMixin, View):
+class CartAddView(View):
     @transaction.atomic
     def post(self, request, product_id):
-        product = get_object_or_404(Product, id=product_id)
         qty = request.POST.get("quantity", "1")
         try:
             qty = int(qty)
         except ValueError:
             qty = 1
-        qty = max(qty, 1)
+        qty = min(max(qty, 1), MAX_LINE_QUANTITY)
+
+        if not request.user.is_authenticated:
+            return guest_cart_add(request, product_id, qty)
 
         cart = get_or_create_cart(request.user)
+        add_to_cart(cart, product_id, qty)
 
-        try:
-            item = CartItem.objects.get(cart=cart, product=product)
-            created = False
-        except CartItem.DoesNotExist:
-            item = CartItem.objects.create(
-                cart=cart,
-                product=product,
-                quantity=qty
-            )
-            created = True
+        invalidate_cart_summary(request.user.id)
+        return cart_line_response(request, cart, product_id)
 
-        return redirect("cart-detail")
-
-class CartDetailView(LoginRequiredMixin, TemplateView):
+class CartDetailView(TemplateView):
     template_name = "store/cart_detail.html"
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        cart = get_or_create_cart(self.request.user)
-        items = cart.items.select_related("product").all()
+    async def get(self, request, *args, **kwargs):
+        user = await load_request_user(request)
+        if user.is_authenticated:
+            cart = await apeek_cart(user)
+            items = [item async for item in cart.get_items().select_related("product")]
+        else:
+            items = await request.guest_cart.aitems()
 
         # keep your template variables compatible:
         lines = []
@@ -151,68 +428,129 @@ class CartDetailView(LoginRequiredMixin, TemplateView):
                 "item_id": item.id,  # useful for update/remove
             })
 
-        context["lines"] = lines
-        context["total"] = total
-        return context
+        # the badge can reuse what we just added up
+        request.cart_summary = {"count": sum(line["quantity"] for line in lines), "subtotal": total}
+
+        context = self.get_context_data(lines=lines, total=total, **kwargs)
+        return self.render_to_response(context)
 
 @method_decorator(require_POST, name="dispatch")
-class CartClearView(LoginRequiredMixin, View):
+class CartClearView(View):
     @transaction.atomic
     def post(self, request):
+        if not request.user.is_authenticated:
+            request.guest_cart.clear()
+            return redirect("cart-detail")
+
         cart = get_or_create_cart(request.user)
         cart.items.all().delete()
+        invalidate_cart_summary(request.user.id)
         return redirect("cart-detail")
 
 @method_decorator(require_POST, name="dispatch")
-class CartIncrementView(LoginRequiredMixin, View):
+class CartIncrementView(View):
     @transaction.atomic
     def post(self, request, product_id):
-        cart = get_or_create_cart(request.user)
-        product = get_object_or_404(Product, id=product_id)
+        if not request.user.is_authenticated:
+            return guest_cart_add(request, product_id, 1)
 
-        try:
-            item = CartItem.objects.get(cart=cart, product=product)
-        except CartItem.DoesNotExist:
-            item = CartItem.objects.create(
-                cart=cart,
-                product=product,
-                quantity=1
-            )
-        else:
-            item.quantity += 1
-            item.save()
+        cart = get_or_create_cart(request.user)
+        add_to_cart(cart, product_id, 1)
 
-        return redirect("cart-detail")
+        invalidate_cart_summary(request.user.id)
+        return cart_line_response(request, cart, product_id)
 
 @method_decorator(require_POST, name="dispatch")
-class CartDecrementView(LoginRequiredMixin, View):
+class CartDecrementView(View):
     @transaction.atomic
     def post(self, request, product_id):
+        if not request.user.is_authenticated:
+            request.guest_cart.decrement(product_id)
+            return guest_line_response(request, product_id)
+
         cart = get_or_create_cart(request.user)
+        decrement_cart_item(cart, product_id)
 
-        item = CartItem.objects.filter(cart=cart, product_id=product_id).first()
+        invalidate_cart_summary(request.user.id)
+        return cart_line_response(request, cart, product_id)
 
-        if item is not None:
-            item.quantity = item.quantity - 1
+@method_decorator(require_POST, name="dispatch")
+class CartRemoveItemView(View):
+    @transaction.atomic
+    def post(self, request, product_id):
+        if not request.user.is_authenticated:
+            request.guest_cart.remove(product_id)
+            return guest_line_response(request, product_id)
 
-            if item.quantity == 0:
-                item.delete()
-            else:
-                item.save()
+        cart = get_or_create_cart(request.user)
+        CartItem.objects.filter(cart=cart, product_id=product_id).delete()
+        invalidate_cart_summary(request.user.id)
+        return cart_line_response(request, cart, product_id)
+
+def parse_cart_batch(request):
+    # JSON: {"items": [{"product_id": 1, "quantity": 2}, ...], "replace": false}
+    # form: product_id=1&quantity=2&product_id=5&quantity=0[&replace=1]
+    if request.content_type == "application/json":
+        payload = json.loads(request.body)
+        operations = [(op["product_id"], op["quantity"]) for op in payload.get("items", [])]
+        replace = bool(payload.get("replace", False))
+    else:
+        operations = zip(request.POST.getlist("product_id"), request.POST.getlist("quantity"))
+        replace = request.POST.get("replace") == "1"
 
-        return redirect("cart-detail")
+    quantities = {}
+    for product_id, quantity in operations:
+        product_id, quantity = int(product_id), int(quantity)
+        if not 0 <= quantity <= MAX_LINE_QUANTITY:
+            raise ValueError(f"quantity must be between 0 and {MAX_LINE_QUANTITY}")
+        quantities[product_id] = quantity  # last one wins
+
+    return quantities, replace
 
 @method_decorator(require_POST, name="dispatch")
-class CartRemoveItemView(LoginRequiredMixin, View):
+class CartBatchView(LoginRequiredMixin, View):
     @transaction.atomic
-    def post(self, request, product_id):
+    def post(self, request):
+        try:
+            quantities, replace = parse_cart_batch(request)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return JsonResponse({"error": f"Invalid cart operations: {e}"}, status=400)
+
         cart = get_or_create_cart(request.user)
-        CartItem.objects.filter(cart=cart, product_id=product_id).delete()
-        return redirect("cart-detail")
+        unknown = set_cart_quantities(cart, quantities, replace=replace)
+        invalidate_cart_summary(request.user.id)
+
+        if request.content_type != "application/json" and not wants_json(request):
+            return redirect("cart-detail")
+
+        items = cart.items.select_related("product").order_by("id")
+        lines = [
+            {
+                "product_id": item.product_id,
+                "title": item.product.title,
+                "quantity": item.quantity,
+                "unit_price": item.product.unit_price,
+                "line_total": item.line_total,
+            }
+            for item in items
+        ]
+
+        return JsonResponse({
+            "lines": lines,
+            "cart": {
+                "total_items": sum(line["quantity"] for line in lines),
+                "subtotal": sum((line["line_total"] for line in lines), Decimal("0.00")),
+            },
+            "unknown_products": unknown,
+        })
 
 @login_required
 def checkout_address(request):
-    cart = get_or_create_cart(request.user)
+    # the form only needs a real cart once it's submitted
+    if request.method == "POST":
+        cart = get_or_create_cart(request.user)
+    else:
+        cart = peek_cart(request.user)
 
     if cart.status != Cart.Status.OPENED:
         raise Http404("This cart is not editable.")
@@ -234,7 +572,7 @@ def checkout_address(request):
 
 @login_required
 def checkout_review(request):
-    cart = get_or_create_cart(request.user)
+    cart = peek_cart(request.user)
 
     # if cart.status != Cart.Status.OPENED:
     #     raise Http404("Cart is not editable.")
@@ -244,11 +582,16 @@ def checkout_review(request):
     if not address:
         return redirect("checkout-address")
 
-    items = cart.items.select_related("product")
+    items = list(cart.items.select_related("product"))
+    subtotal = sum((item.line_total for item in items), Decimal("0.00"))
+
+    # totals come from the rows we already have, the badge reuses them too
+    request.cart_summary = {"count": sum(item.quantity for item in items), "subtotal": subtotal}
 
     return render(request, "store/checkout_review.html", {
         "cart": cart,
         "items": items,
+        "subtotal": subtotal,
         "address": address,
     })
 
@@ -256,48 +599,145 @@ def checkout_review(request):
 @login_required
 @transaction.atomic
 def place_order(request):
-    cart = get_or_create_cart(request.user)
-
-    # if cart.status != Cart.Status.OPENED:
-    #     raise Http404("Cart is not editable.")
-    #
-    # if cart.total_items <= 0:
-    #     return redirect("cart-detail")
+    # Lock the cart first: a second submit of the same basket waits here,
+    # then finds it FROZEN and stops instead of ordering it again
+    cart = Cart.objects.select_for_update().filter(user=request.user, status=Cart.Status.OPENED).first()
+    if cart is None:
+        return redirect("cart-detail")
 
     address = getattr(cart, "shipping_address", None)
     if not address:
         return redirect("checkout-address")
 
-    # Get/Create Customer profile linked to this user
-    customer, _ = Customer.objects.get_or_create(
-        user=request.user,
-        defaults={
-            "first_name": request.user.first_name or "",
-            "last_name": request.user.last_name or "",
-            "email": request.user.email or f"user{request.user.id}@example.com",
-            "phone": address.phone,
-        }
-    )
+    items = list(cart.items.all())
+    if not items:
+        return redirect("cart-detail")
+
+    # Lock the products in id order, so two checkouts sharing products
+    # queue up instead of deadlocking, and nobody can oversell them
+    products = {
+        product.id: product
+        for product in Product.objects.select_for_update()
+        .filter(id__in=[item.product_id for item in items])
+        .order_by("id")
+    }
+
+    short = [item for item in items if products[item.product_id].inventory < item.quantity]
+    if short:
+        titles = ", ".join(products[item.product_id].title for item in short)
+        messages.error(request, f"Not enough stock for: {titles}. Please update your basket.")
+        return redirect("cart-detail")
+
+    # Customer profile linked to this user, usually already cached with it
+    try:
+        customer = request.user.customer_profile
+    except Customer.DoesNotExist:
+        customer, _ = Customer.objects.get_or_create(
+            user=request.user,
+            defaults={
+                "first_name": request.user.first_name or "",
+                "last_name": request.user.last_name or "",
+                "email": request.user.email or f"user{request.user.id}@example.com",
+                "phone": address.phone,
+            }
+        )
 
     # Create order
     order = Order.objects.create(customer=customer)
 
-    # Copy items to OrderItem (snapshot unit_price now)
-    items = cart.items.select_related("product")
-    for item in items:
-        OrderItem.objects.create(
+    # Copy items to OrderItem (snapshot unit_price now), one INSERT
+    OrderItem.objects.bulk_create([
+        OrderItem(
             order=order,
-            product=item.product,
+            product=products[item.product_id],
             quantity=item.quantity,
-            unit_price=item.product.unit_price,
+            unit_price=products[item.product_id].unit_price,
         )
+        for item in items
+    ])
+
+    # Take the stock, one UPDATE (rows are still locked from above).
+    # bulk_update skips the signals, so last_update and the caches keyed on
+    # it (ETags, the ?since= feed) are handled here.
+    now = timezone.now()
+    sold_out = False
+    for item in items:
+        product = products[item.product_id]
+        product.inventory -= item.quantity
+        sold_out |= product.in_stock and product.inventory <= 0
+        product.in_stock = product.inventory > 0
+        product.last_update = now
+    Product.objects.bulk_update(products.values(), ["inventory", "in_stock", "last_update"])
+    sync_listings(products.keys())
+    invalidate_product_versions(list(products))
+    # Catalog pages and facets only show in_stock, so only a sell-out
+    # empties them; bumping on every order would keep the cache cold
+    if sold_out:
+        transaction.on_commit(bump_catalog_version)
 
     # Freeze cart
     cart.status = Cart.Status.FROZEN
     cart.save(update_fields=["status"])
 
+    # Reporting rollups last, the brand rows are shared by every checkout
+    # of that brand so hold their locks for as short as possible
+    record_order_sales(order, [
+        (products[item.product_id], item.quantity, products[item.product_id].unit_price) for item in items
+    ])
+
     return redirect("checkout-success")
 
+@staff_member_required
+def catalog_feed(request, fmt):
+    if fmt not in FEED_FORMATS:
+        raise Http404("Unknown feed format.")
+
+    try:
+        since = parse_since(request.GET.get("since"))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    rows = feed_rows(since=since, base_url=request.build_absolute_uri("/").rstrip("/"))
+    chunks = buffered(feed_chunks(fmt, rows))
+    filename = f"catalog.{fmt}"
+    content_type = FEED_FORMATS[fmt]
+    encoding = None
+
+    if request.GET.get("gzip") == "1":
+        # a .gz file download
+        chunks = gzip_chunks(chunks)
+        content_type = "application/gzip"
+        filename += ".gz"
+    elif "gzip" in request.headers.get("Accept-Encoding", ""):
+        # compressed on the wire only
+        chunks = gzip_chunks(chunks)
+        encoding = "gzip"
+
+    if isinstance(request, ASGIRequest):
+        chunks = aiter_chunks(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    if encoding:
+        response["Content-Encoding"] = encoding
+
+    response["Vary"] = "Accept-Encoding"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+@staff_member_required
+def sales_dashboard(request):
+    try:
+        days = min(max(int(request.GET.get("days", 30)), 1), 366)
+    except ValueError:
+        days = 30
+
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return render(request, "store/sales_dashboard.html", {
+        "days": days,
+        "since": since,
+        "report": sales_report(since),
+    })
+
 @login_required
 def checkout_success(request):
     return render(request, "store/checkout_success.html")
\ No newline at end of file
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'storefront.settings')
+# settings.py turns persistent connections off under ASGI
+os.environ.setdefault('DJANGO_ASGI', '1')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'playground',
     'debug_toolbar',
     'store',
@@ -65,11 +67,14 @@ ACCOUNT_EMAIL_VERIFICATION = 'none'
 
 MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'store.query_budget.QueryBudgetMiddleware',
+    'store.db_routing.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.auth_cache.CachedAuthenticationMiddleware',
+    'store.guest_cart.GuestCartMiddleware',
 
     'allauth.account.middleware.AccountMiddleware',
 
@@ -77,6 +82,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware'
 ]
 
+# Per-request query counting (store/query_budget.py). Always on with DEBUG,
+# QUERY_BUDGETS=1 turns it on elsewhere, e.g. on a staging box.
+QUERY_BUDGETS_ENABLED = os.environ.get('QUERY_BUDGETS') == '1'
+
 INTERNAL_IPS = [
     # ...
     "127.0.0.1",
@@ -107,17 +116,71 @@ WSGI_APPLICATION = 'storefront.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# Set by storefront/asgi.py. Under ASGI each request's DB work runs on a
+# fresh thread, so persistent connections would pile up instead of being
+# reused; they are closed after every request there (or use DB_POOL=1).
+ASGI = os.environ.get('DJANGO_ASGI') == '1'
+
+
+def database(host='localhost', port='5432'):
+    db = {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': 'mydb',
         'USER': 'hazemdb',
         'PASSWORD': 'hazem123',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'HOST': host,
+        'PORT': port,
+    }
+    if os.environ.get('DB_POOL') == '1':
+        # psycopg connection pool (pip install "psycopg[pool]"), checks each
+        # connection before handing it out. Can't be combined with CONN_MAX_AGE.
+        from psycopg_pool import ConnectionPool
+        db['OPTIONS'] = {'pool': {
+            'min_size': 2, 'max_size': 10, 'timeout': 10, 'check': ConnectionPool.check_connection,
+        }}
+    elif ASGI:
+        db['CONN_MAX_AGE'] = 0
+    else:
+        # persistent connections, pinged again before reuse after a request
+        db['CONN_MAX_AGE'] = 60
+        db['CONN_HEALTH_CHECKS'] = True
+    return db
+
+
+DATABASES = {'default': database()}
+
+# Read replicas as DB_REPLICAS=host:port,host:port. Safe reads are spread
+# over them by store.db_routing, everything else stays on 'default'.
+DATABASE_REPLICAS = []
+for i, address in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(','))):
+    host, _, port = address.partition(':')
+    alias = f'replica{i + 1}'
+    DATABASES[alias] = {**database(host, port or '5432'), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['store.db_routing.PrimaryReplicaRouter']
+
+# After a write, keep that browser on the primary this long (replication lag)
+REPLICA_STICKY_SECONDS = 5
+
+# Cache
+# Catalog facets/listings and cart badges are cached here. Point this at a
+# shared backend (e.g. django.core.cache.backends.redis.RedisCache) when
+# running more than one process, otherwise invalidation stays per-process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'storefront',
     }
 }
 
+# Sessions are read from the cache and only written through to the DB, so a
+# request with a warm session costs no django_session query. The logged-in
+# user is cached too (store/auth_cache.py). With more than one process the
+# cache should be shared (Redis/Memcached) for this to pay off.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -160,4 +223,11 @@ STATIC_URL = 'static/'
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Worker processes that resize product images (see store/images.py)
+IMAGE_DERIVATIVE_WORKERS = 2
+
+# Answer ?tag= filters from a per-process tag -> product ids index instead
+# of a subquery (see store/tag_index.py)
+STORE_TAG_INDEX = False
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -3,7 +3,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.db import models
 
 class Tag(models.Model):
-    label = models.CharField(max_length=255)
+    label = models.CharField(max_length=255, db_index=True)
 
 class TaggedItem(models.Model):
     # Type ....
@@ -12,3 +12,11 @@ class TaggedItem(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
+
+    class Meta:
+        indexes = [
+            # tags of these objects (listing pages)
+            models.Index(fields=["content_type", "object_id"], name="taggeditem_object_idx"),
+            # objects with this tag (filtering); object_id makes it index-only
+            models.Index(fields=["tag", "content_type", "object_id"], name="taggeditem_tag_idx"),
+        ]
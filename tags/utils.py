@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count
+
+from .models import TaggedItem
+
+
+def _content_type(model):
+    # a subquery instead of get_for_model(): nothing runs until the outer
+    # query does, so this is safe to build from async code too
+    opts = model._meta
+    return ContentType.objects.filter(app_label=opts.app_label, model=opts.model_name).values("pk")
+
+
+def tagged_items(model):
+    return TaggedItem.objects.filter(content_type__in=_content_type(model))
+
+
+def tagged_object_ids(model, labels, match_all=True):
+    """
+    Lazy `object_id` subquery of the objects tagged with `labels`: all of
+    them (AND) or any of them (OR). Use as `filter(id__in=...)`.
+    """
+    items = tagged_items(model).filter(tag__label__in=labels)
+
+    if match_all and len(labels) > 1:
+        # distinct label, so a tag attached twice doesn't count twice
+        return (
+            items.values("object_id")
+            .annotate(matched=Count("tag__label", distinct=True))
+            .filter(matched=len(labels))
+            .values("object_id")
+        )
+    return items.values("object_id")
+
+
+def _tag_rows(model, object_ids):
+    return (
+        tagged_items(model)
+        .filter(object_id__in=object_ids)
+        .values_list("object_id", "tag__label")
+        .order_by("tag__label")
+    )
+
+
+def _group(rows):
+    tags = defaultdict(list)
+    for object_id, label in rows:
+        if label not in tags[object_id]:
+            tags[object_id].append(label)
+    return tags
+
+
+def get_tags_for(model, object_ids):
+    # {object_id: [labels]} for a page of objects, one query
+    return _group(_tag_rows(model, list(object_ids)))
+
+
+async def aget_tags_for(model, object_ids):
+    return _group([row async for row in _tag_rows(model, list(object_ids))])
+
+
+def attach_tags(objects, model=None):
+    objects = list(objects)
+    if not objects:
+        return objects
+    tags = get_tags_for(model or type(objects[0]), [obj.pk for obj in objects])
+    for obj in objects:
+        obj.tag_list = tags.get(obj.pk, [])
+    return objects
+
+
+async def aattach_tags(objects, model=None):
+    objects = list(objects)
+    if not objects:
+        return objects
+    tags = await aget_tags_for(model or type(objects[0]), [obj.pk for obj in objects])
+    for obj in objects:
+        obj.tag_list = tags.get(obj.pk, [])
+    return objects
+
+
+def build_tag_index(model):
+    # {label: frozenset(object ids)} for every tag on `model`, one query
+    index = defaultdict(set)
+    for object_id, label in tagged_items(model).values_list("object_id", "tag__label").iterator(chunk_size=5000):
+        index[label].add(object_id)
+    return {label: frozenset(ids) for label, ids in index.items()}
+
+
+def match_tag_index(index, labels, match_all=True):
+    sets = sorted((index.get(label, frozenset()) for label in labels), key=len)
+    if not sets:
+        return frozenset()
+    # smallest set first, the intersection can only shrink from there
+    return sets[0].intersection(*sets[1:]) if match_all else frozenset().union(*sets)